@@ -1,9 +1,18 @@
-import json
+import os
 from fastapi import APIRouter
-from app.core.detector import hybrid_detect
+from app.core.conversation import add_turn
+from app.core.detector import hybrid_detect_batch, reload_exemplars
+from app.core.exemplar_index import get_exemplar_index
+from app.core.long_text import LONG_TEXT_THRESHOLD, scan_long_text
 from app.core.policy_engine import evaluate_policy
 from app.core.prompt_sanitizer import sanitize_prompt
 from app.core.ethics_guardian import ethics_check
+from app.core.scan_context import ScanContext
+from app.services.detection_pool import DetectionOverloaded, run_detection
+from app.services.micro_batcher import MICRO_BATCHING, MicroBatcher, register_batcher
+from app.services.session_store import SESSION_SAVE_RETRIES, get_session_store
+from app.services.single_flight import SINGLE_FLIGHT, SingleFlight, register_flight
+from app.services.verdict_cache import get_verdict_cache
 
 # Optionally import logger - gracefully degrade if dependencies unavailable
 try:
@@ -13,23 +22,11 @@ except:
     logger_available = False
     async def log_incident(data): pass
 
-# Optional Redis cache - gracefully degrade if not available
-try:
-    from app.services.redis_cache import get_cached_policy, set_cached_policy
-    # Test Redis connection
-    import redis
-    _redis_client = redis.Redis(host="localhost", port=6379, decode_responses=True)
-    _redis_client.ping()
-    redis_available = True
-    print("[OK] Redis cache available")
-except Exception as e:
-    print(f"[WARN] Redis cache unavailable: {e}")
-    redis_available = False
-    def get_cached_policy(text): return None
-    def set_cached_policy(text, result): pass
-
 router = APIRouter()
 
+# Upper bound on texts accepted by /scan-batch
+SCAN_BATCH_MAX = int(os.getenv("SCAN_BATCH_MAX", "500"))
+
 
 def _convert_numpy_types(obj):
     if isinstance(obj, dict):
@@ -45,6 +42,97 @@ def _convert_numpy_types(obj):
         return obj
     return str(obj)
 
+def _detect(texts, contexts):
+    """Hybrid detection plus the ethics regex guard (memoized on each ctx); runs on the detection pool"""
+    results = hybrid_detect_batch(texts, contexts)
+    for text, ctx in zip(texts, contexts):
+        ethics_check(text, ctx)
+    return results
+
+def _detect_items(items):
+    """_detect for the micro-batcher: items are (text, ctx) pairs from concurrent /scan calls"""
+    return _detect([text for text, _ in items], [ctx for _, ctx in items])
+
+def _detect_long(text, ctx):
+    """Windowed long-document scan plus the ethics regex guard; runs on the detection pool"""
+    result = scan_long_text(text)
+    ethics_check(text, ctx)
+    return result
+
+# Concurrent /scan requests share one batched inference
+_scan_batcher = register_batcher("scan", MicroBatcher(_detect_items))
+
+# Concurrent /scan requests for the same text share one detection
+_scan_flight = register_flight("scan", SingleFlight())
+
+def _verdict(result: dict) -> dict:
+    """Cacheable part of a scan result (sanitized text depends on the exact input, not the verdict)"""
+    return {"hybrid_analysis": result["hybrid_analysis"], "ethics_analysis": result["ethics_analysis"]}
+
+def _cached_result(text: str, verdict: dict) -> dict:
+    sanitized = sanitize_prompt(text) if verdict["hybrid_analysis"]["decision"] == "sanitize" else None
+    return {**verdict, "sanitized": sanitized, "timestamp": None}
+
+def _confidence(brain: dict):
+    """A brain's confidence for the audit log; None when skipped cascade tiers make it only a lower bound"""
+    return None if brain.get("lower_bound") else brain["confidence"]
+
+async def _finalize_scan(text: str, hybrid_result: dict, ctx: ScanContext = None, cache: bool = True, mode: str = ""):
+    """Apply the ethics override, sanitize, audit-log and cache one detection result"""
+    hybrid_result = _convert_numpy_types(hybrid_result)
+    ethics_result = ethics_check(text, ctx)
+
+    if ethics_result.get("ethical_risk"):
+        hybrid_result["decision"] = "block"
+        hybrid_result["risk"] = max(hybrid_result.get("risk", 0), ethics_result.get("score", 0.9))
+    
+    sanitized = None
+    if hybrid_result["decision"] == "sanitize":
+        sanitized = sanitize_prompt(text)
+
+    # Log all prompts (audit trail)
+    if logger_available:
+        try:
+            await log_incident({
+                "text": text,
+                "decision": hybrid_result["decision"],
+                "risk": hybrid_result["risk"],
+                "triggered_by": hybrid_result["triggered_by"],
+                "injection_confidence": _confidence(hybrid_result["injection"]),
+                "ethics_confidence": _confidence(hybrid_result["ethics"]),
+                "narrative_confidence": _confidence(hybrid_result["narrative"]),
+                "risk_lower_bound": hybrid_result.get("risk_lower_bound", False),
+                "skipped_tiers": hybrid_result.get("skipped_tiers", []),
+                "original": text
+            })
+        except Exception as log_err:
+            print(f"Logging error (non-blocking): {log_err}")
+
+    result = {
+        "hybrid_analysis": hybrid_result,
+        "ethics_analysis": ethics_result,
+        "sanitized": sanitized,
+        "timestamp": None  # Add timestamp if needed
+    }
+
+    result = _convert_numpy_types(result)
+
+    if cache:
+        await get_verdict_cache().set(text, _verdict(result), mode=mode)
+
+    return result
+
+async def _scan(text: str, long_text: bool, mode: str) -> dict:
+    """Run 3-brain hybrid detection for one /scan text and finalize it"""
+    ctx = ScanContext(text)
+    if long_text:
+        hybrid_result = await run_detection(_detect_long, text, ctx)
+    elif MICRO_BATCHING:
+        hybrid_result = await _scan_batcher.submit((text, ctx))
+    else:
+        hybrid_result = (await run_detection(_detect, [text], [ctx]))[0]
+    return await _finalize_scan(text, hybrid_result, ctx, mode=mode)
+
 @router.post("/scan")
 async def scan_prompt(payload: dict):
     try:
@@ -53,60 +141,133 @@ async def scan_prompt(payload: dict):
         if not text:
             return {"error": "No text provided", "status": "failed"}
 
-        if redis_available:
-            cached = get_cached_policy(text)
-            if cached:
-                print(f"[OK] Cache HIT for: {text[:50]}...")
-                return {"cached": True, "result": json.loads(cached)}
-            else:
-                print(f"[MISS] Cache MISS for: {text[:50]}...")
-
-        # Run 3-brain hybrid detection
-        hybrid_result = _convert_numpy_types(hybrid_detect(text))
-        ethics_result = ethics_check(text)
+        long_text = payload.get("long_text") or (LONG_TEXT_THRESHOLD and len(text) > LONG_TEXT_THRESHOLD)
+        mode = "long" if long_text else ""
+        cached = await get_verdict_cache().get(text, mode)
+        if cached:
+            return {"cached": True, "result": _cached_result(text, cached)}
 
-        if ethics_result.get("ethical_risk"):
-            hybrid_result["decision"] = "block"
-            hybrid_result["risk"] = max(hybrid_result.get("risk", 0), ethics_result.get("score", 0.9))
-        
-        sanitized = None
-        if hybrid_result["decision"] == "sanitize":
-            sanitized = sanitize_prompt(text)
-
-        # Log all prompts (audit trail)
-        if logger_available:
-            try:
-                await log_incident({
-                    "text": text,
-                    "decision": hybrid_result["decision"],
-                    "risk": hybrid_result["risk"],
-                    "triggered_by": hybrid_result["triggered_by"],
-                    "injection_confidence": hybrid_result["injection"]["confidence"],
-                    "ethics_confidence": hybrid_result["ethics"]["confidence"],
-                    "narrative_confidence": hybrid_result["narrative"]["confidence"],
-                    "original": text
-                })
-            except Exception as log_err:
-                print(f"Logging error (non-blocking): {log_err}")
-
-        result = {
-            "hybrid_analysis": hybrid_result,
-            "ethics_analysis": ethics_result,
-            "sanitized": sanitized,
-            "timestamp": None  # Add timestamp if needed
-        }
-
-        result = _convert_numpy_types(result)
-
-        if redis_available:
-            try:
-                set_cached_policy(text, result)
-            except Exception as cache_err:
-                print(f"Cache set error: {cache_err}")
+        if SINGLE_FLIGHT:
+            # Identical in-flight scans (same verdict cache key) run once
+            result, shared = await _scan_flight.do(get_verdict_cache().key(text, mode), lambda: _scan(text, long_text, mode))
+            if shared:
+                # Same verdict; sanitized text is rebuilt from this caller's exact input
+                return {"cached": False, "coalesced": True, "result": _cached_result(text, _verdict(result))}
+        else:
+            result = await _scan(text, long_text, mode)
 
         return {"cached": False, "result": result}
     
+    except DetectionOverloaded:
+        raise
     except Exception as e:
         print(f"Scan error: {e}")
         return {"error": str(e), "status": "failed"}
 
+@router.post("/scan-batch")
+async def scan_batch(payload: dict):
+    """Scan a group of texts (RAG chunks, chat history) with one batched inference"""
+    try:
+        texts = payload.get("texts", [])
+
+        if not texts or not isinstance(texts, list):
+            return {"error": "No texts provided", "status": "failed"}
+        if len(texts) > SCAN_BATCH_MAX:
+            return {"error": f"Batch too large (max {SCAN_BATCH_MAX})", "status": "failed"}
+
+        # Only non-empty strings are scanned; null, numbers etc. get the per-item error, never coerced
+        valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text]
+        results = [{"error": "No text provided", "status": "failed"} for _ in texts]
+
+        # One L1 pass + one Redis MGET for the whole batch
+        cache = get_verdict_cache()
+        pending = []
+        for i, cached in zip(valid, await cache.get_many([texts[i] for i in valid])):
+            if cached:
+                results[i] = {"cached": True, "result": _cached_result(texts[i], cached)}
+            else:
+                pending.append(i)
+
+        # Run 3-brain hybrid detection once for every uncached text
+        contexts = [ScanContext(texts[i]) for i in pending]
+        hybrid_results = await run_detection(_detect, [texts[i] for i in pending], contexts)
+        for i, hybrid_result, ctx in zip(pending, hybrid_results, contexts):
+            results[i] = {"cached": False, "result": await _finalize_scan(texts[i], hybrid_result, ctx, cache=False)}
+        await cache.set_many([(texts[i], _verdict(results[i]["result"]), None) for i in pending])
+
+        return {"count": len(results), "results": results}
+
+    except DetectionOverloaded:
+        raise
+    except Exception as e:
+        print(f"Batch scan error: {e}")
+        return {"error": str(e), "status": "failed"}
+
+@router.post("/sessions/{conversation_id}/scan")
+async def scan_turn(conversation_id: str, payload: dict):
+    """Scan one conversation turn; only this turn is scanned, history lives in the session state"""
+    try:
+        text = payload.get("text", "")
+
+        if not text:
+            return {"error": "No text provided", "status": "failed"}
+
+        ctx = ScanContext(text)
+        if MICRO_BATCHING:
+            hybrid_result = await _scan_batcher.submit((text, ctx))
+        else:
+            hybrid_result = (await run_detection(_detect, [text], [ctx]))[0]
+
+        # O(1) session update; the lock keeps concurrent turns of one conversation from interleaving
+        # on this worker, and a failed compare-and-set means another worker saved first: re-read and retry
+        store = get_session_store()
+        async with store.lock(conversation_id):
+            for _ in range(SESSION_SAVE_RETRIES):
+                state = await store.get_or_create(conversation_id)
+                session = add_turn(state, ctx.lower, ctx.hits, hybrid_result)
+                if await store.save(state):
+                    break
+            else:
+                print(f"[WARN] Session {conversation_id}: turn not saved after {SESSION_SAVE_RETRIES} conflicting writes")
+
+        if session["escalated"]:
+            hybrid_result = {**hybrid_result, "decision": "block", "risk": session["session_risk"],
+                             "triggered_by": [t for t in hybrid_result["triggered_by"] if t != "none"] + ["session"]}
+        # Not cached: an escalated verdict belongs to this conversation, not to the text
+        result = await _finalize_scan(text, hybrid_result, ctx, cache=False)
+
+        return {"cached": False, "result": result, "session": session}
+
+    except DetectionOverloaded:
+        raise
+    except Exception as e:
+        print(f"Session scan error: {e}")
+        return {"error": str(e), "status": "failed"}
+
+@router.get("/sessions/{conversation_id}")
+async def session_state(conversation_id: str):
+    state = await get_session_store().get(conversation_id)
+    if state is None:
+        return {"error": "Unknown or expired conversation", "status": "failed"}
+    return {key: value for key, value in state.items() if key != "tail"}
+
+@router.delete("/sessions/{conversation_id}")
+async def session_delete(conversation_id: str):
+    return {"deleted": await get_session_store().delete(conversation_id)}
+
+@router.get("/sessions")
+def session_store_stats():
+    return get_session_store().stats()
+
+@router.get("/exemplars")
+def exemplar_index_stats():
+    return get_exemplar_index().stats()
+
+@router.post("/exemplars/reload")
+def exemplar_index_reload():
+    """Re-read the attack exemplar library without restarting the server"""
+    try:
+        return {"status": "reloaded", "index": reload_exemplars()}
+    except Exception as e:
+        print(f"Exemplar reload error: {e}")
+        return {"error": str(e), "status": "failed"}
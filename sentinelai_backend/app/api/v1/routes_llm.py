@@ -1,8 +1,11 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.core.detector import detect_prompt_injection
 from app.core.policy_engine import evaluate_policy
 from app.core.prompt_sanitizer import sanitize_prompt
-from app.services.llm_router import send_to_llm
+from app.core.stream_scanner import guard_stream
+from app.services import llm_router
+from app.services.detection_pool import run_detection
 
 router = APIRouter()
 
@@ -11,7 +14,7 @@ async def ask_llm(payload: dict):
 
     text = payload["text"]
 
-    detection = detect_prompt_injection(text)
+    detection = await run_detection(detect_prompt_injection, text)
     decision = evaluate_policy(detection)
 
     if decision["decision"] == "block":
@@ -19,4 +22,10 @@ async def ask_llm(payload: dict):
 
     prompt = sanitize_prompt(text) if decision["decision"] == "sanitize" else text
 
-    return send_to_llm(prompt)
+    if payload.get("stream"):
+        if not llm_router.OPENAI_API_KEY:
+            return {"error": "LLM API key missing"}
+        # Output is scanned chunk by chunk and cut if it starts leaking secrets
+        return StreamingResponse(guard_stream(llm_router.stream_llm(prompt)), media_type="text/plain")
+
+    return llm_router.send_to_llm(prompt)
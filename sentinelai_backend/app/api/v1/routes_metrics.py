@@ -1,8 +1,49 @@
 from fastapi import APIRouter
 from app.services.metrics_service import get_attack_metrics
+from app.core.embedding_cache import get_embedding_cache
+from app.services.detection_pool import get_detection_pool
+from app.services.micro_batcher import batcher_stats
+from app.services.audit_writer import audit_writer_stats
+from app.services.single_flight import single_flight_stats
+from app.services.verdict_cache import get_verdict_cache
+
+try:
+    from app.services.kafka_producer import producer_stats
+except Exception:
+    producer_stats = None
 
 router = APIRouter()
 
 @router.get("/summary")
 def metrics_summary():
     return get_attack_metrics()
+
+@router.get("/embedding-cache")
+def embedding_cache_stats():
+    return get_embedding_cache().stats()
+
+@router.get("/detection-pool")
+def detection_pool_stats():
+    return get_detection_pool().stats()
+
+@router.get("/micro-batcher")
+def micro_batcher_stats():
+    return batcher_stats()
+
+@router.get("/verdict-cache")
+def verdict_cache_stats():
+    return get_verdict_cache().stats()
+
+@router.get("/single-flight")
+def single_flight_metrics():
+    return single_flight_stats()
+
+@router.get("/audit-writer")
+def audit_writer_metrics():
+    return audit_writer_stats()
+
+@router.get("/kafka-producer")
+def kafka_producer_metrics():
+    if producer_stats is None:
+        return {"available": False, "error": "confluent_kafka not installed"}
+    return producer_stats()
@@ -5,6 +5,8 @@ from app.utils.logger import log_incident
 from app.core.ethics_guardian import ethics_check
 from app.core.intent_engine import detect_hidden_intent
 from app.core.llm_guard import llm_reasoning_guard
+from app.core.scan_context import ScanContext
+from app.services.detection_pool import run_detection
 from app.utils.heatmap_generator import generate_text_heatmap, extract_trigger_words
 
 # Try to import vision pipeline (optional)
@@ -22,6 +24,17 @@ except Exception as e:
 
 router = APIRouter()
 
+
+def _text_brains(text: str, ctx: ScanContext):
+    """All text brains for one prompt (runs on the detection pool)"""
+    return (
+        detect_prompt_injection(text, ctx),
+        ethics_check(text, ctx),
+        detect_hidden_intent(text, ctx),
+        llm_reasoning_guard(text, ctx)
+    )
+
+
 @router.post("/full-scan")
 async def full_scan(
     text: str = Form(default=""),
@@ -32,10 +45,8 @@ async def full_scan(
         return {"error": "Either text or file must be provided", "status": "failed"}
 
     # ---------- TEXT DETECTION ----------
-    text_result = detect_prompt_injection(text)
-    ethics_result = ethics_check(text)
-    intent_result = detect_hidden_intent(text)
-    llm_result = llm_reasoning_guard(text)
+    ctx = ScanContext(text)  # shared preprocessing for every text brain
+    text_result, ethics_result, intent_result, llm_result = await run_detection(_text_brains, text, ctx)
 
     # Extract trigger words from results
     trigger_patterns = []
@@ -50,7 +61,7 @@ async def full_scan(
     vision_result = {"deepfake_score": 0.0, "face_detected": False, "artifacts": {}}
     if file:
         image_bytes = await file.read()
-        vision_result = analyze_image(image_bytes)
+        vision_result = await run_detection(analyze_image, image_bytes)
 
     # ---------- COMBINE SCORES ----------
     combined_score = max(
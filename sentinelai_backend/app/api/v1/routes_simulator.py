@@ -5,12 +5,13 @@ from app.core.prompt_sanitizer import sanitize_prompt
 from app.utils.logger import log_incident
 from app.utils.trace_bus import emit_trace
 from app.db.mongo import attack_logs
+from app.services.detection_pool import run_detection
 
 # Optional Redis cache (graceful fallback)
 try:
     from app.services.redis_cache import get_cached_policy
 except Exception:  # pragma: no cover
-    def get_cached_policy(text: str):
+    async def get_cached_policy(text: str):
         return None
 
 router = APIRouter()
@@ -27,7 +28,7 @@ async def simulate_attack(payload: dict):
     await emit_trace("Prompt Received", {"text": text})
     
     # Run detection
-    detection = detect_prompt_injection(text)
+    detection = await run_detection(detect_prompt_injection, text)
     await emit_trace("Hybrid Detector Score", detection)
     print(f"✓ Detection Complete - Confidence: {detection['confidence']}")
     
@@ -37,7 +38,7 @@ async def simulate_attack(payload: dict):
     print(f"✓ Policy Evaluated - Decision: {decision['decision'].upper()}")
 
     # Redis cache check
-    cached = get_cached_policy(text)
+    cached = await get_cached_policy(text)
     await emit_trace("Redis Cache Check", {"hit": bool(cached)})
     
     # Sanitize if needed
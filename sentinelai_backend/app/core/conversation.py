@@ -0,0 +1,115 @@
+"""
+Rolling state for multi-turn conversation scanning.
+
+Multi-turn jailbreaks spread an attack over several messages that each
+look harmless. Instead of re-scanning the whole history, every new turn
+is scanned on its own and folded into a small aggregate:
+
+- cumulative risk: a decayed sum of the risk of every suspicious turn
+  (risk >= SANITIZE_THRESHOLD); the session is escalated to block once it
+  reaches SESSION_ESCALATION, even if no single turn did
+- matcher hits per tag over the whole conversation
+- the tail of the previous turn (longest pattern - 1 characters): only
+  that tail plus the head of the new turn is re-fed to the shared
+  matcher, which catches a phrase split across two messages
+- the last SESSION_MAX_TURNS per-turn results
+
+A turn update is O(its own hits) plus a constant-size matcher pass. The
+state is plain JSON so it can live in Redis between workers.
+"""
+import os
+import time
+
+from app.core.detector import BLOCK_THRESHOLD, SANITIZE_THRESHOLD
+from app.core.pattern_matcher import get_matcher
+
+SESSION_DECAY = float(os.getenv("SESSION_DECAY", "0.8"))
+SESSION_ESCALATION = float(os.getenv("SESSION_ESCALATION", "2.0"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))
+
+# Tags whose phrases, split across two turns, block the session
+CROSS_TURN_BLOCK_TAGS = ("injection.attack",)
+
+# Turns are joined with this when looking for cross-turn phrases
+_SEPARATOR = " "
+
+
+def new_state(conversation_id: str) -> dict:
+    return {
+        "conversation_id": conversation_id,
+        "turns": 0,
+        "cumulative_risk": 0.0,
+        "max_risk": 0.0,
+        "tag_counts": {},
+        "cross_turn_hits": [],
+        "escalated": False,
+        "tail": "",
+        "history": [],
+        "updated_at": time.time(),
+    }
+
+
+def _cross_turn_hits(tail: str, text_lower: str) -> list:
+    """Patterns that start in the previous turn's tail and end in this turn"""
+    matcher = get_matcher()
+    head = text_lower[:max(matcher.max_length() - 1, 0)]
+    joined = tail + _SEPARATOR + head
+    boundary = len(tail) + len(_SEPARATOR)
+    hits, _ = matcher.feed(joined)
+    return [h for h in hits if h.start < len(tail) and h.end > boundary]
+
+
+def add_turn(state: dict, text_lower: str, hits, result: dict) -> dict:
+    """
+    Fold one scanned turn into the session state (in place) and return the
+    session verdict for it. `hits` are the turn's matcher hits (ctx.hits),
+    `result` its hybrid_detect result.
+    """
+    risk = float(result["risk"])
+    turn = state["turns"] + 1
+
+    counts = state["tag_counts"]
+    for h in hits:
+        counts[h.tag] = counts.get(h.tag, 0) + 1
+
+    cross = _cross_turn_hits(state["tail"], text_lower) if state["tail"] else []
+    for h in cross:
+        counts[h.tag] = counts.get(h.tag, 0) + 1
+        state["cross_turn_hits"].append({"turn": turn, "tag": h.tag, "pattern": h.pattern})
+    del state["cross_turn_hits"][:-SESSION_MAX_TURNS]
+
+    suspicious = risk if risk >= SANITIZE_THRESHOLD else 0.0
+    state["cumulative_risk"] = round(state["cumulative_risk"] * SESSION_DECAY + suspicious, 4)
+    state["max_risk"] = max(state["max_risk"], risk)
+    state["turns"] = turn
+
+    reasons = []
+    if state["cumulative_risk"] >= SESSION_ESCALATION:
+        reasons.append("cumulative_risk")
+    if any(h.tag in CROSS_TURN_BLOCK_TAGS for h in cross):
+        reasons.append("cross_turn_pattern")
+    escalate = bool(reasons) and result["decision"] != "block"
+    state["escalated"] = state["escalated"] or bool(reasons)
+
+    keep = max(get_matcher().max_length() - 1, 0)
+    state["tail"] = (state["tail"] + _SEPARATOR + text_lower)[-keep:] if keep else ""
+    state["history"].append({
+        "turn": turn,
+        "decision": "block" if escalate else result["decision"],
+        "risk": round(risk, 4),
+        "triggered_by": result.get("triggered_by", []),
+    })
+    del state["history"][:-SESSION_MAX_TURNS]
+    state["updated_at"] = time.time()
+
+    return {
+        "conversation_id": state["conversation_id"],
+        "turn": turn,
+        "cumulative_risk": state["cumulative_risk"],
+        "max_risk": round(state["max_risk"], 4),
+        "escalated": escalate,
+        "escalation_reasons": reasons,
+        "cross_turn_hits": [{"tag": h.tag, "pattern": h.pattern} for h in cross],
+        "tag_counts": dict(counts),
+        "session_risk": max(risk, BLOCK_THRESHOLD) if reasons else risk,
+    }
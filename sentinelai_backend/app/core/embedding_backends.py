@@ -0,0 +1,78 @@
+"""
+Pluggable embedding backends for the semantic brain.
+
+All backends wrap the same sentence-transformers model and expose
+`encode(texts) -> float32 ndarray`:
+
+- torch: the stock PyTorch forward pass
+- int8:  PyTorch with dynamic int8 quantization of every nn.Linear layer
+- onnx:  ONNX Runtime through sentence-transformers' onnx backend
+         (optionally a pre-quantized file via EMBEDDING_ONNX_FILE)
+
+Selected with EMBEDDING_BACKEND; a backend whose dependencies are missing
+falls back to torch. `key` identifies model + backend so caches and
+persisted exemplar matrices are never shared across backends.
+"""
+import os
+
+import numpy as np
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")  # e.g. onnx/model_qint8_avx512.onnx
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = self._load(SentenceTransformer, model_name)
+
+    def _load(self, SentenceTransformer, model_name):
+        return SentenceTransformer(model_name)
+
+    @property
+    def key(self) -> str:
+        return f"{self.model_name}:{self.name}"
+
+    def encode(self, texts):
+        return np.asarray(self.model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+
+
+class Int8Backend(TorchBackend):
+    name = "int8"
+
+    def _load(self, SentenceTransformer, model_name):
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(TorchBackend):
+    name = "onnx"
+
+    def _load(self, SentenceTransformer, model_name):
+        model_kwargs = {"file_name": EMBEDDING_ONNX_FILE} if EMBEDDING_ONNX_FILE else None
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "int8": Int8Backend,
+    "onnx": OnnxBackend,
+}
+
+
+def load_backend(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """Instantiate the configured backend, falling back to torch if it cannot load"""
+    cls = BACKENDS.get(backend)
+    if cls is None:
+        print(f"[WARN] Unknown embedding backend '{backend}', using torch")
+        cls = TorchBackend
+    if cls is not TorchBackend:
+        try:
+            return cls(model_name)
+        except Exception as e:
+            print(f"[WARN] Embedding backend '{backend}' unavailable: {e}. Using torch.")
+    return TorchBackend(model_name)
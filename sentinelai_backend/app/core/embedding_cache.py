@@ -0,0 +1,115 @@
+"""
+In-process LRU cache in front of SentenceTransformer.encode.
+
+Entries are keyed by a hash of the normalized text and hold float32
+embeddings. The cache remembers which model produced its entries and
+clears itself as soon as a different model name is used, so a model swap
+never serves stale vectors. A repeated prompt skips the forward pass.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List
+
+import numpy as np
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace; the tokenizer ignores both"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = EMBED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.model_name = None
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def _check_model(self, model_name: str):
+        # Caller holds the lock
+        if model_name != self.model_name:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.model_name = model_name
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, text: str, model_name: str):
+        k = self.key(text)
+        with self._lock:
+            self._check_model(model_name)
+            emb = self._entries.get(k)
+            if emb is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(k)
+            self.hits += 1
+            return emb
+
+    def put(self, text: str, model_name: str, embedding):
+        if self.max_entries <= 0:
+            return
+        emb = np.asarray(embedding, dtype=np.float32)
+        k = self.key(text)
+        with self._lock:
+            self._check_model(model_name)
+            old = self._entries.pop(k, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[k] = emb
+            self._bytes += emb.nbytes
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def encode(self, texts: List[str], model_name: str, encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for `texts` as a float32 matrix. Cached rows are reused;
+        the misses are encoded together in a single `encode` call.
+        """
+        rows = [self.get(t, model_name) for t in texts]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            fresh = np.asarray(encode([texts[i] for i in missing]), dtype=np.float32)
+            for j, i in enumerate(missing):
+                rows[i] = fresh[j]
+                self.put(texts[i], model_name, fresh[j])
+        return np.stack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "memory_bytes": self._bytes,
+            }
+
+
+_cache = EmbeddingCache()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    return _cache
@@ -1,23 +1,58 @@
 import os
 import joblib
+import threading
+from typing import List
+from app.core.compiled_model import compile_linear, use_fastpath
+from app.core.hashed_model import load_hashed
+from app.core.pattern_matcher import register_patterns
+from app.core.scan_context import ScanContext, ensure_contexts, prime_tfidf
 
 # Path to models
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(SCRIPT_DIR, "..", "ml", "ethics_model.pkl")
 VECTORIZER_PATH = os.path.join(SCRIPT_DIR, "..", "ml", "ethics_vectorizer.pkl")
 
-# Load models at module level with graceful fallback
+# Models are loaded once by load_model() (eagerly at startup, see app.core.warmup)
 ethics_model = None
 vectorizer = None
+hashed_model = None  # memory-mapped hashed-feature model (FEATURE_MODE=hashed)
+compiled_model = None  # n-gram lookup for single prompts (app.core.compiled_model)
+_loaded = False
+_load_lock = threading.Lock()
 
-try:
-    ethics_model = joblib.load(MODEL_PATH)
-    vectorizer = joblib.load(VECTORIZER_PATH)
-    print("[LOAD] Ethics model loaded successfully")
-except Exception as e:
-    print(f"[FALLBACK] Ethics model not available: {type(e).__name__}. Using rule-based detection.")
 
-def detect_unethical_intent(text: str):
+def load_model():
+    """Load the ethics model + vectorizer once; later calls are a flag check"""
+    global ethics_model, vectorizer, hashed_model, compiled_model, _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        hashed_model = load_hashed("ethics")
+        if hashed_model is None:
+            try:
+                ethics_model = joblib.load(MODEL_PATH)
+                vectorizer = joblib.load(VECTORIZER_PATH)
+                print("[LOAD] Ethics model loaded successfully")
+                compiled_model = compile_linear("ethics", vectorizer, ethics_model)
+            except Exception as e:
+                ethics_model = None
+                vectorizer = None
+                print(f"[FALLBACK] Ethics model not available: {type(e).__name__}. Using rule-based detection.")
+        _loaded = True
+
+
+# Fallback keywords used when the ML model is unavailable
+UNETHICAL_KEYWORDS = [
+    "hate", "racist", "sexist", "bigot", "genocide", "murder", "kill",
+    "toxic", "abuse", "harassment", "bullying", "deceptive", "manipulative",
+    "fraud", "scam", "exploit", "illegal", "drug", "bomb", "weapon"
+]
+
+register_patterns("ethics.keyword", UNETHICAL_KEYWORDS)
+
+def detect_unethical_intent(text: str, ctx: ScanContext = None):
     """
     Detect unethical intent in text.
     
@@ -38,26 +73,55 @@ def detect_unethical_intent(text: str):
             "confidence": float (0-1)
         }
     """
+    return detect_unethical_intent_batch([text], [ctx])[0]
+
+
+def detect_unethical_intent_batch(texts: List[str], contexts: List[ScanContext] = None):
+    """Batched detect_unethical_intent: one vectorizer transform for all texts"""
+    if not _loaded:
+        load_model()
+    contexts = ensure_contexts(texts, contexts)
+    return ethics_results(contexts, get_ml_scores(contexts))
+
+
+def ml_available() -> bool:
+    return hashed_model is not None or (ethics_model is not None and vectorizer is not None)
+
+
+def get_ml_scores(contexts: List[ScanContext]):
+    """Probability of class 1 (unethical) per text, or None without the ML model"""
+    if not ml_available():
+        return None
+    if not contexts:
+        return []
+    if hashed_model is not None:
+        return hashed_model.predict_proba(contexts)
+    if use_fastpath(compiled_model, contexts):
+        return compiled_model.predict_proba(contexts)
+    vec = prime_tfidf(contexts, "ethics", vectorizer)
+    return ethics_model.predict_proba(vec)[:, 1]
+
+
+def ethics_results(contexts: List[ScanContext], scores):
+    """Ethics verdicts from ML scores; keyword rules when the model is unavailable"""
     # Use ML model if available
-    if ethics_model is not None and vectorizer is not None:
-        vec = vectorizer.transform([text])
-        score = ethics_model.predict_proba(vec)[0][1]  # Probability of class 1 (unethical)
-        return {
-            "unethical": score > 0.6,
-            "confidence": round(float(score), 2)
-        }
+    if ml_available():
+        return [
+            {
+                "unethical": score > 0.6,
+                "confidence": round(float(score), 2)
+            }
+            for score in scores
+        ]
     
     # Fallback: rule-based detection
-    unethical_keywords = [
-        "hate", "racist", "sexist", "bigot", "genocide", "murder", "kill",
-        "toxic", "abuse", "harassment", "bullying", "deceptive", "manipulative",
-        "fraud", "scam", "exploit", "illegal", "drug", "bomb", "weapon"
-    ]
-    text_lower = text.lower()
-    found_keywords = [kw for kw in unethical_keywords if kw in text_lower]
-    
-    confidence = len(found_keywords) / len(unethical_keywords)
-    return {
-        "unethical": confidence > 0.2,
-        "confidence": round(confidence, 2)
-    }
+    results = []
+    for ctx in contexts:
+        found_keywords = ctx.matched("ethics.keyword")
+
+        confidence = len(found_keywords) / len(UNETHICAL_KEYWORDS)
+        results.append({
+            "unethical": confidence > 0.2,
+            "confidence": round(confidence, 2)
+        })
+    return results
@@ -1,4 +1,5 @@
-import re
+from app.core.regex_engine import PatternSet
+from app.core.scan_context import ScanContext
 
 # Enhanced patterns using regex for flexible matching
 UNETHICAL_PATTERNS = [
@@ -18,17 +19,21 @@ UNETHICAL_PATTERNS = [
     (r"artistic.{0,20}(nudity|nude|undress)", "artistic nudity"),
 ]
 
-def ethics_check(text: str):
-    text_lower = text.lower()
-    matched_triggers = []
+# All patterns compiled once into a single bounded-window alternation
+_ETHICS_SET = PatternSet(UNETHICAL_PATTERNS)
 
-    for pattern_regex, pattern_name in UNETHICAL_PATTERNS:
-        if re.search(pattern_regex, text_lower):
-            matched_triggers.append({
-                "pattern": pattern_name,
-                "match": re.search(pattern_regex, text_lower).group(),
-                "severity": "high"
-            })
+def ethics_check(text: str, ctx: ScanContext = None):
+    ctx = ctx or ScanContext(text)
+    found = ctx.memo(("regex", "ethics"), lambda: _ETHICS_SET.first_matches(ctx.lower))
+
+    matched_triggers = [
+        {
+            "pattern": _ETHICS_SET.names[i],
+            "match": found[i].group(),
+            "severity": "high"
+        }
+        for i in sorted(found)
+    ]
 
     if matched_triggers:
         return {
@@ -0,0 +1,211 @@
+"""
+Attack-exemplar similarity index for the semantic brain.
+
+Exemplars (curated jailbreak prompts) are read from a CSV data file with
+`id,text` columns. Their embeddings are L2-normalized, persisted once as a
+float32 `.npy` matrix next to the other ML artifacts and memory-mapped on
+later starts, so restarts no longer re-encode the library. Lookup is a
+top-k dot product, optionally in a reduced PCA space, and returns the
+nearest exemplar ids alongside the max score. Editing the data file is
+picked up by a background reload without restarting the server.
+"""
+import csv
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EXEMPLARS_PATH = os.getenv("ATTACK_EXEMPLARS_PATH", os.path.join(ROOT, "data", "attack_exemplars.csv"))
+EXEMPLAR_INDEX_DIR = os.getenv("EXEMPLAR_INDEX_DIR", os.path.join(ROOT, "ml"))
+EXEMPLAR_PCA_DIM = int(os.getenv("EXEMPLAR_PCA_DIM", "0"))  # 0 = search in the full embedding space
+EXEMPLAR_TOP_K = int(os.getenv("EXEMPLAR_TOP_K", "3"))
+EXEMPLAR_RELOAD_INTERVAL = float(os.getenv("EXEMPLAR_RELOAD_INTERVAL", "5"))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def load_exemplars(path: str) -> Tuple[List[str], List[str]]:
+    ids, texts = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = (row.get("text") or "").strip()
+            if text:
+                ids.append(row.get("id") or str(len(ids)))
+                texts.append(text)
+    return ids, texts
+
+
+class _IndexState:
+    def __init__(self, ids, matrix, mtime, fingerprint, pca_mean=None, pca_components=None, reduced=None):
+        self.ids = ids
+        self.matrix = matrix                  # (n, dim) normalized, memory-mapped
+        self.mtime = mtime
+        self.fingerprint = fingerprint
+        self.pca_mean = pca_mean              # (dim,)
+        self.pca_components = pca_components  # (pca_dim, dim)
+        self.reduced = reduced                # (n, pca_dim) normalized
+
+
+class ExemplarIndex:
+    def __init__(self, path: str = EXEMPLARS_PATH, index_dir: str = EXEMPLAR_INDEX_DIR,
+                 pca_dim: int = EXEMPLAR_PCA_DIM):
+        self.path = path
+        self.index_dir = index_dir
+        self.pca_dim = pca_dim
+        self._state = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._last_check = 0.0
+        self.reloads = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._state is not None
+
+    @staticmethod
+    def _model_key(model_name: str) -> str:
+        return hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:8]
+
+    def _matrix_path(self, model_name: str, fingerprint: str) -> str:
+        return os.path.join(self.index_dir, f"attack_exemplars.{self._model_key(model_name)}.{fingerprint[:16]}.npy")
+
+    def _build(self, model_name: str, encode: Callable[[List[str]], np.ndarray]) -> _IndexState:
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "rb") as f:
+            fingerprint = hashlib.sha1(model_name.encode("utf-8") + b"\0" + f.read()).hexdigest()
+        ids, texts = load_exemplars(self.path)
+        if not texts:
+            return _IndexState([], np.zeros((0, 0), dtype=np.float32), mtime, fingerprint)
+
+        matrix_path = self._matrix_path(model_name, fingerprint)
+        if not os.path.exists(matrix_path):
+            matrix = _normalize(np.asarray(encode(texts), dtype=np.float32))
+            os.makedirs(self.index_dir, exist_ok=True)
+            # Per-process temp name: several workers may encode the same file at once
+            tmp_path = f"{matrix_path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, matrix)
+            os.replace(tmp_path, matrix_path)
+            print(f"[LOAD] Encoded {len(ids)} attack exemplars -> {matrix_path}")
+            self._prune(model_name, matrix_path)
+        matrix = np.load(matrix_path, mmap_mode="r")
+
+        state = _IndexState(ids, matrix, mtime, fingerprint)
+        if 0 < self.pca_dim < min(matrix.shape):
+            mean = np.asarray(matrix.mean(axis=0), dtype=np.float32)
+            _, _, vt = np.linalg.svd(np.asarray(matrix) - mean, full_matrices=False)
+            state.pca_mean = mean
+            state.pca_components = vt[:self.pca_dim].astype(np.float32)
+            state.reduced = _normalize((np.asarray(matrix) - mean) @ state.pca_components.T)
+        return state
+
+    def _prune(self, model_name: str, keep: str):
+        """
+        Drop matrices left behind by earlier versions of the exemplar file
+        for the same model. Matrices of other models / backends and other
+        workers' in-flight temp files are left alone.
+        """
+        prefix = f"attack_exemplars.{self._model_key(model_name)}."
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            if name.startswith(prefix) and name.endswith(".npy") and not name.endswith(".tmp.npy") and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load(self, model_name: str, encode: Callable[[List[str]], np.ndarray]):
+        """(Re)build the index from the data file; the swap is atomic for readers"""
+        state = self._build(model_name, encode)
+        with self._lock:
+            self._state = state
+            self._last_check = time.time()
+            self.reloads += 1
+        return state
+
+    def maybe_reload(self, model_name: str, encode: Callable[[List[str]], np.ndarray]):
+        """
+        Cheap mtime check (at most every EXEMPLAR_RELOAD_INTERVAL seconds).
+        A changed file is re-indexed on a background thread while lookups
+        keep using the current matrix.
+        """
+        now = time.time()
+        if self._reloading or now - self._last_check < EXEMPLAR_RELOAD_INTERVAL:
+            return
+        # Called from every detection worker thread: one of them does the check
+        with self._lock:
+            if self._reloading or now - self._last_check < EXEMPLAR_RELOAD_INTERVAL:
+                return
+            self._last_check = now
+            state = self._state
+            try:
+                changed = state is None or os.path.getmtime(self.path) != state.mtime
+            except OSError:
+                return
+            if not changed:
+                return
+            self._reloading = True
+
+        def _reload():
+            try:
+                self.load(model_name, encode)
+                print(f"[OK] Attack exemplar index reloaded ({len(self._state.ids)} exemplars)")
+            except Exception as e:
+                print(f"[WARN] Exemplar reload failed: {e}")
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=_reload, name="exemplar-reload", daemon=True).start()
+
+    def search(self, queries: np.ndarray, k: int = EXEMPLAR_TOP_K):
+        """
+        Top-k exemplars for each query embedding.
+
+        Returns (max_scores, top_ids, top_scores): max cosine similarity per
+        query plus the ids and scores of its k nearest exemplars.
+        """
+        state = self._state
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if state is None or not state.ids:
+            n = len(queries)
+            return np.zeros(n), [[] for _ in range(n)], [[] for _ in range(n)]
+
+        if state.reduced is not None:
+            scores = _normalize((queries - state.pca_mean) @ state.pca_components.T) @ state.reduced.T
+        else:
+            scores = queries @ np.asarray(state.matrix).T
+
+        k = max(1, min(k, scores.shape[1]))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        top_ids = [[state.ids[j] for j in row] for row in top]
+        return top_scores[:, 0].astype(float), top_ids, top_scores.astype(float).tolist()
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "path": self.path,
+            "exemplars": len(state.ids) if state else 0,
+            "dim": int(state.matrix.shape[1]) if state else 0,
+            "pca_dim": int(state.reduced.shape[1]) if state and state.reduced is not None else 0,
+            "fingerprint": state.fingerprint if state else None,
+            "reloads": self.reloads,
+        }
+
+
+_index = ExemplarIndex()
+
+
+def get_exemplar_index() -> ExemplarIndex:
+    return _index
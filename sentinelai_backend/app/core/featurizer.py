@@ -0,0 +1,85 @@
+"""
+Shared featurizer for the TF-IDF brains.
+
+The injection pipeline (word 1-2 grams), the ethics vectorizer (1-3) and
+the narrative vectorizer (1-3) would each tokenize and n-gram the same
+prompt again inside `transform`. Here a prompt is tokenized once and its
+word n-grams up to NGRAM_MAX are counted once (memoized on the
+ScanContext); each brain then only looks those n-grams up in its own
+vocabulary and applies its fitted IDF weighting and normalization.
+
+The count matrix is built exactly the way CountVectorizer builds it and
+then passed through the vectorizer's own TfidfTransformer, so the result
+is identical to `vectorizer.transform`. Vectorizers with any non-default
+analysis setting (char analyzer, stop words, custom tokenizer, ...) are
+not shareable and fall back to their own `transform`.
+"""
+from collections import Counter
+from typing import List
+
+import numpy as np
+import scipy.sparse as sp
+
+# Longest word n-gram any brain uses (ethics / narrative: 1-3)
+NGRAM_MAX = 3
+DEFAULT_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+def ngram_counts(tokens: List[str], max_n: int = NGRAM_MAX) -> List[Counter]:
+    """Counts of every word n-gram, n = 1..max_n; element n-1 holds the n-grams"""
+    counts = [Counter(tokens)]
+    for n in range(2, max_n + 1):
+        counts.append(Counter(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)))
+    return counts
+
+
+def shares_tokenization(vectorizer) -> bool:
+    """True if the vectorizer's analyzer is the shared lowercase word n-gram pass"""
+    return (
+        hasattr(vectorizer, "_tfidf")
+        and hasattr(vectorizer, "vocabulary_")
+        and getattr(vectorizer, "input", None) == "content"
+        and vectorizer.analyzer == "word"
+        and vectorizer.lowercase
+        and vectorizer.preprocessor is None
+        and vectorizer.tokenizer is None
+        and vectorizer.strip_accents is None
+        and vectorizer.stop_words is None
+        and vectorizer.token_pattern == DEFAULT_TOKEN_PATTERN
+        and vectorizer.ngram_range[1] <= NGRAM_MAX
+    )
+
+
+def count_matrix(contexts, vectorizer):
+    """Term-count matrix of `contexts` in the vectorizer's vocabulary, as CountVectorizer builds it"""
+    vocabulary = vectorizer.vocabulary_
+    min_n, max_n = vectorizer.ngram_range
+    indices, values, indptr = [], [], [0]
+    for ctx in contexts:
+        row = {}
+        grams = ctx.ngrams
+        for n in range(min_n, max_n + 1):
+            for gram, count in grams[n - 1].items():
+                j = vocabulary.get(gram)
+                if j is not None:
+                    row[j] = count
+        indices.extend(row.keys())
+        values.extend(row.values())
+        indptr.append(len(indices))
+
+    X = sp.csr_matrix(
+        (np.asarray(values, dtype=np.intc), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+        shape=(len(contexts), len(vocabulary)),
+        dtype=vectorizer.dtype,
+    )
+    X.sort_indices()
+    if vectorizer.binary:
+        X.data.fill(1)
+    return X
+
+
+def transform(contexts, vectorizer):
+    """TF-IDF rows for `contexts`: shared n-grams when possible, else the vectorizer's own transform"""
+    if shares_tokenization(vectorizer):
+        return vectorizer._tfidf.transform(count_matrix(contexts, vectorizer), copy=False)
+    return vectorizer.transform([ctx.text for ctx in contexts])
@@ -0,0 +1,114 @@
+"""
+Stateless hashed-feature linear models for the TF-IDF brains.
+
+An alternative to the vocabulary-based TfidfVectorizer pickles: word
+n-grams are hashed into a fixed number of buckets (the same murmurhash3
+scheme as sklearn's HashingVectorizer), so there is no vocabulary dict to
+unpickle. A model is three small files per brain in app/ml:
+
+    <name>_hashed_coef.npy   float32 (n_features,)  logistic coefficients
+    <name>_hashed_idf.npy    float32 (n_features,)  IDF weights
+    <name>_hashed.json       n_features, ngram_range, intercept, ...
+
+The arrays are memory-mapped read-only, so load time is near zero and
+every worker shares the same page-cache pages. Scoring reuses the
+ScanContext n-grams: TF-IDF weights of the hashed buckets, L2 norm, dot
+with the coefficients and a sigmoid.
+
+Trained with `python app/ml/train_detector.py --hashed`; served when
+FEATURE_MODE=hashed and the brain's files exist.
+"""
+import json
+import os
+
+import numpy as np
+from sklearn.utils import murmurhash3_32
+
+from app.core.featurizer import NGRAM_MAX
+
+FEATURE_MODE = os.getenv("FEATURE_MODE", "vocab").lower()  # vocab | hashed
+HASHED_N_FEATURES = int(os.getenv("HASHED_N_FEATURES", str(2 ** 18)))
+
+ML_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ml"))
+
+
+def artifact_paths(name: str, ml_dir: str = ML_DIR) -> dict:
+    return {
+        "coef": os.path.join(ml_dir, f"{name}_hashed_coef.npy"),
+        "idf": os.path.join(ml_dir, f"{name}_hashed_idf.npy"),
+        "meta": os.path.join(ml_dir, f"{name}_hashed.json"),
+    }
+
+
+def bucket(gram: str, n_features: int) -> int:
+    """Column of an n-gram, as HashingVectorizer(alternate_sign=False) computes it"""
+    return abs(murmurhash3_32(gram, seed=0)) % n_features
+
+
+class HashedLinearModel:
+    def __init__(self, coef: np.ndarray, idf: np.ndarray, meta: dict):
+        self.coef = coef
+        self.idf = idf
+        self.meta = meta
+        self.n_features = int(meta["n_features"])
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.intercept = float(meta["intercept"])
+        self.sublinear_tf = bool(meta.get("sublinear_tf", False))
+        self.norm = meta.get("norm", "l2")
+        if self.ngram_range[1] > NGRAM_MAX:
+            raise ValueError(f"ngram_range {self.ngram_range} exceeds the shared n-grams (max {NGRAM_MAX})")
+
+    @classmethod
+    def load(cls, name: str, ml_dir: str = ML_DIR):
+        """Memory-map a brain's hashed model; None if it has not been trained"""
+        paths = artifact_paths(name, ml_dir)
+        if not all(os.path.exists(p) for p in paths.values()):
+            return None
+        with open(paths["meta"]) as f:
+            meta = json.load(f)
+        return cls(np.load(paths["coef"], mmap_mode="r"), np.load(paths["idf"], mmap_mode="r"), meta)
+
+    def _features(self, ctx):
+        """(columns, tf-idf weights) of one text; colliding n-grams add up like HashingVectorizer"""
+        counts = {}
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, max_n + 1):
+            for gram, count in ctx.ngrams[n - 1].items():
+                j = bucket(gram, self.n_features)
+                counts[j] = counts.get(j, 0) + count
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.sublinear_tf:
+            tf = np.log(tf) + 1
+        weights = tf * self.idf[cols]
+        if self.norm == "l2" and len(weights):
+            weights /= np.sqrt(np.dot(weights, weights))
+        return cols, weights
+
+    def decision_function(self, contexts) -> np.ndarray:
+        scores = np.full(len(contexts), self.intercept)
+        for i, ctx in enumerate(contexts):
+            cols, weights = self._features(ctx)
+            if len(cols):
+                scores[i] += float(np.dot(weights, self.coef[cols]))
+        return scores
+
+    def predict_proba(self, contexts) -> np.ndarray:
+        """Probability of the positive class (injection / unethical / malicious) per text"""
+        return 1.0 / (1.0 + np.exp(-self.decision_function(contexts)))
+
+
+def load_hashed(name: str):
+    """The brain's hashed model when FEATURE_MODE=hashed and it is trained, else None"""
+    if FEATURE_MODE != "hashed":
+        return None
+    try:
+        model = HashedLinearModel.load(name)
+    except Exception as e:
+        print(f"[WARN] Hashed {name} model unreadable: {e}")
+        return None
+    if model is None:
+        print(f"[WARN] FEATURE_MODE=hashed but no hashed {name} model; using the vocabulary model")
+    else:
+        print(f"[LOAD] Hashed {name} model mapped ({model.n_features} features)")
+    return model
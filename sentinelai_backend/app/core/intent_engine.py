@@ -1,3 +1,6 @@
+from app.core.pattern_matcher import register_patterns
+from app.core.scan_context import ScanContext
+
 SUSPICIOUS_INTENTS = [
     "fictional story",
     "educational example",
@@ -16,21 +19,17 @@ SENSITIVE_ACTIONS = [
     "explicit"
 ]
 
-def detect_hidden_intent(text: str):
-    text = text.lower()
+register_patterns("intent.suspicious", SUSPICIOUS_INTENTS)
+register_patterns("intent.sensitive", SENSITIVE_ACTIONS)
 
-    intent_score = 0.0
-    detected = []
+def detect_hidden_intent(text: str, ctx: ScanContext = None):
+    ctx = ctx or ScanContext(text)
 
-    for phrase in SUSPICIOUS_INTENTS:
-        if phrase in text:
-            intent_score += 0.3
-            detected.append(phrase)
+    suspicious = ctx.matched("intent.suspicious")
+    sensitive = ctx.matched("intent.sensitive")
 
-    for action in SENSITIVE_ACTIONS:
-        if action in text:
-            intent_score += 0.6
-            detected.append(action)
+    intent_score = 0.3 * len(suspicious) + 0.6 * len(sensitive)
+    detected = suspicious + sensitive
 
     return {
         "intent_risk": intent_score > 0.5,
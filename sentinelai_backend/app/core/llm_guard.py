@@ -1,22 +1,24 @@
 import os
+from app.core.pattern_matcher import register_patterns
+from app.core.scan_context import ScanContext
 
-# Later you can replace this with Gemini/OpenAI call
-def llm_reasoning_guard(text: str):
-    text_lower = text.lower()
+# Simulated reasoning logic (safe starter)
+RISKY_CONTEXTS = [
+    "fictional story",
+    "pretend",
+    "roleplay",
+    "artistic nude",
+    "describe body"
+]
+
+register_patterns("llm.context", RISKY_CONTEXTS)
 
-    # Simulated reasoning logic (safe starter)
-    risky_contexts = [
-        "fictional story",
-        "pretend",
-        "roleplay",
-        "artistic nude",
-        "describe body"
-    ]
+# Later you can replace this with Gemini/OpenAI call
+def llm_reasoning_guard(text: str, ctx: ScanContext = None):
+    ctx = ctx or ScanContext(text)
+    hits = ctx.matched("llm.context")
 
-    score = 0.0
-    for r in risky_contexts:
-        if r in text_lower:
-            score += 0.4
+    score = 0.4 * len(hits)
 
     return {
         "llm_risk": score > 0.5,
@@ -0,0 +1,114 @@
+"""
+Windowed scanning for long documents (RAG documents, emails).
+
+MiniLM only embeds the first ~256 word pieces of a text, so an injection
+buried deep in a 50-500 KB document is invisible to the semantic brain,
+while the TF-IDF and keyword passes dilute it across the whole document.
+Long-text mode instead splits the input into overlapping windows that
+each fit the embedding model and scans them lazily, a few windows per
+hybrid_detect_batch call. It stops at the first window whose risk
+crosses the block threshold and reports that window's character offsets.
+
+The source can be a string or any iterable of string chunks (e.g. a file
+read in blocks). Only the current chunk and one batch of windows are held
+at a time, so memory stays bounded whatever the document size.
+"""
+import os
+from itertools import islice
+from typing import Iterable, Iterator, Tuple, Union
+
+from app.core.detector import BLOCK_THRESHOLD, hybrid_detect, hybrid_detect_batch
+
+# ~1000 characters stay under MiniLM's 256 word-piece limit for English text
+WINDOW_CHARS = int(os.getenv("SCAN_WINDOW_CHARS", "1000"))
+# Overlap so a phrase split across a window boundary is whole in one of them
+WINDOW_OVERLAP = int(os.getenv("SCAN_WINDOW_OVERLAP", "200"))
+# Windows scored per hybrid_detect_batch call
+WINDOW_BATCH = int(os.getenv("SCAN_WINDOW_BATCH", "8"))
+# /scan switches to long-text mode above this many characters (0 = only on request)
+LONG_TEXT_THRESHOLD = int(os.getenv("LONG_TEXT_THRESHOLD", "4000"))
+
+_WHITESPACE = (" ", "\n", "\t")
+
+
+def _snap(buf: str, lo: int, hi: int) -> int:
+    """Last whitespace in buf[lo:hi] so windows end between words; hi if there is none"""
+    cut = max(buf.rfind(c, lo, hi) for c in _WHITESPACE)
+    return cut if cut > lo else hi
+
+
+def iter_windows(source: Union[str, Iterable[str]], window_chars: int = WINDOW_CHARS,
+                 overlap: int = WINDOW_OVERLAP) -> Iterator[Tuple[int, int, str]]:
+    """
+    Yield (start, end, window) with absolute character offsets. Consecutive
+    windows share `overlap` characters; window ends are snapped back to
+    whitespace within the last quarter of the window.
+    """
+    if overlap < 0 or overlap * 2 > window_chars:
+        raise ValueError("overlap must be between 0 and half the window size")
+    if isinstance(source, str):
+        source = (source,)
+
+    buf, base, pos, last_end = "", 0, 0, 0  # base: offset of buf[0]; pos: next window start in buf
+    for chunk in source:
+        # Drop what no later window needs before appending the next chunk
+        buf, base, pos = buf[pos:] + chunk, base + pos, 0
+        while len(buf) - pos > window_chars:
+            hi = pos + window_chars
+            cut = _snap(buf, hi - window_chars // 4, hi)
+            yield base + pos, base + cut, buf[pos:cut]
+            last_end = base + cut
+            pos = cut - overlap
+
+    # Tail: whatever the last full window did not reach (or the whole text if short)
+    if base + len(buf) > last_end or last_end == 0:
+        yield base + pos, base + len(buf), buf[pos:]
+
+
+def scan_windows(source, window_chars: int = WINDOW_CHARS, overlap: int = WINDOW_OVERLAP,
+                 batch_size: int = WINDOW_BATCH):
+    """Lazily yield (start, end, hybrid result) per window, batch_size windows per inference"""
+    windows = iter_windows(source, window_chars, overlap)
+    while True:
+        group = list(islice(windows, batch_size))
+        if not group:
+            return
+        results = hybrid_detect_batch([w for _, _, w in group])
+        for (start, end, _), result in zip(group, results):
+            yield start, end, result
+
+
+def scan_long_text(source, window_chars: int = WINDOW_CHARS, overlap: int = WINDOW_OVERLAP,
+                   batch_size: int = WINDOW_BATCH, stop_at: float = BLOCK_THRESHOLD) -> dict:
+    """
+    hybrid_detect over a long document, window by window.
+
+    Returns the riskiest window's hybrid result plus a "long_text" section:
+    windows scanned, characters covered, the riskiest window's offsets and,
+    if scanning stopped early, the offending window that crossed `stop_at`.
+    """
+    worst, worst_span, offending = None, (0, 0), None
+    scanned, covered = 0, 0
+    for start, end, result in scan_windows(source, window_chars, overlap, batch_size):
+        scanned += 1
+        covered = end
+        if worst is None or result["risk"] > worst["risk"]:
+            worst, worst_span = result, (start, end)
+        if result["risk"] >= stop_at:
+            offending = {"start": start, "end": end}
+            break
+
+    if worst is None:
+        worst = hybrid_detect("")
+    return {
+        **worst,
+        "long_text": {
+            "windows_scanned": scanned,
+            "chars_scanned": covered,
+            "window_chars": window_chars,
+            "overlap": overlap,
+            "stopped_early": offending is not None,
+            "offending_window": offending,
+            "riskiest_window": {"start": worst_span[0], "end": worst_span[1]},
+        },
+    }
@@ -1,21 +1,48 @@
 import os
 import joblib
+import threading
+import numpy as np
+from typing import List
+from app.core.compiled_model import compile_linear, use_fastpath
+from app.core.hashed_model import load_hashed
+from app.core.pattern_matcher import register_patterns
+from app.core.scan_context import ScanContext, ensure_contexts, prime_tfidf
 
 # Path to models
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(SCRIPT_DIR, "..", "ml", "narrative_model.pkl")
 VECTORIZER_PATH = os.path.join(SCRIPT_DIR, "..", "ml", "narrative_vectorizer.pkl")
 
-# Load models at module level with graceful fallback
+# Models are loaded once by load_model() (eagerly at startup, see app.core.warmup)
 narrative_model = None
 vectorizer = None
+hashed_model = None  # memory-mapped hashed-feature model (FEATURE_MODE=hashed)
+compiled_model = None  # n-gram lookup for single prompts (app.core.compiled_model)
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load_model():
+    """Load the narrative model + vectorizer once; later calls are a flag check"""
+    global narrative_model, vectorizer, hashed_model, compiled_model, _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        hashed_model = load_hashed("narrative")
+        if hashed_model is None:
+            try:
+                narrative_model = joblib.load(MODEL_PATH)
+                vectorizer = joblib.load(VECTORIZER_PATH)
+                print("[LOAD] Narrative model loaded successfully")
+                compiled_model = compile_linear("narrative", vectorizer, narrative_model)
+            except Exception as e:
+                narrative_model = None
+                vectorizer = None
+                print(f"[FALLBACK] Narrative model not available: {type(e).__name__}. Using rule-based detection.")
+        _loaded = True
 
-try:
-    narrative_model = joblib.load(MODEL_PATH)
-    vectorizer = joblib.load(VECTORIZER_PATH)
-    print("[LOAD] Narrative model loaded successfully")
-except Exception as e:
-    print(f"[FALLBACK] Narrative model not available: {type(e).__name__}. Using rule-based detection.")
 
 # Dangerous narrative patterns (rule-based layer)
 DANGEROUS_GOALS = [
@@ -81,7 +108,11 @@ SAFE_PATTERNS = [
     "understand"
 ]
 
-def extract_narrative_intent(text: str):
+register_patterns("narrative.goal", DANGEROUS_GOALS)
+register_patterns("narrative.framing", DECEPTIVE_FRAMING)
+register_patterns("narrative.safe", SAFE_PATTERNS)
+
+def extract_narrative_intent(text: str, ctx: ScanContext = None):
     """
     Detect hidden malicious intent in narratives and stories.
     
@@ -101,37 +132,77 @@ def extract_narrative_intent(text: str):
             "signals": list of detected patterns
         }
     """
+    return extract_narrative_intent_batch([text], [ctx])[0]
+
+
+def extract_narrative_intent_batch(texts: List[str], contexts: List[ScanContext] = None):
+    """Batched extract_narrative_intent: one vectorizer transform for all texts"""
+    if not _loaded:
+        load_model()
+    contexts = ensure_contexts(texts, contexts)
+    return narrative_results(contexts, get_ml_scores(contexts))
+
+
+def ml_available() -> bool:
+    return hashed_model is not None or (vectorizer is not None and narrative_model is not None)
+
+
+def _is_short(ctx: ScanContext) -> bool:
     # Short messages (< 15 chars) are likely greetings, not threats
-    if len(text.strip()) < 15:
-        return {
-            "malicious": False,
-            "confidence": 0.0,
-            "ml_score": 0.0,
-            "signals": [],
-            "deceptive_framing": False
-        }
-    
-    text_lower = text.lower()
-    
-    # Check for safe educational patterns
-    is_safe_query = False
-    for safe_pattern in SAFE_PATTERNS:
-        if text_lower.startswith(safe_pattern) or f" {safe_pattern}" in text_lower:
-            is_safe_query = True
-            break
-    
+    return len(ctx.stripped) < 15
+
+
+def get_ml_scores(contexts: List[ScanContext]) -> np.ndarray:
+    """ML probability of malicious per text (0 for short texts or without the model)"""
+    eligible = [i for i, c in enumerate(contexts) if not _is_short(c)]
+
     # ML-based detection (with fallback if model unavailable)
-    ml_score = 0.0
-    if vectorizer is not None and narrative_model is not None:
+    ml_scores = np.zeros(len(contexts))
+    if eligible and ml_available():
         try:
-            vec = vectorizer.transform([text])
-            ml_score = narrative_model.predict_proba(vec)[0][1]  # Probability of malicious
+            rows = [contexts[i] for i in eligible]
+            if hashed_model is not None:
+                ml_scores[eligible] = hashed_model.predict_proba(rows)
+            elif use_fastpath(compiled_model, rows):
+                ml_scores[eligible] = compiled_model.predict_proba(rows)
+            else:
+                vec = prime_tfidf(rows, "narrative", vectorizer)
+                ml_scores[eligible] = narrative_model.predict_proba(vec)[:, 1]  # Probability of malicious
         except Exception as e:
-            ml_score = 0.0
+            ml_scores[:] = 0.0
+    return ml_scores
+
+
+def narrative_results(contexts: List[ScanContext], ml_scores) -> list:
+    """Narrative verdicts from the ML scores plus the rule-based signals"""
+    results = []
+    for i, ctx in enumerate(contexts):
+        if _is_short(ctx):
+            results.append({
+                "malicious": False,
+                "confidence": 0.0,
+                "ml_score": 0.0,
+                "signals": [],
+                "deceptive_framing": False
+            })
+        else:
+            results.append(_narrative_result(ctx, float(ml_scores[i])))
+    return results
+
+
+def _narrative_result(ctx: ScanContext, ml_score: float):
+    """Combine rule-based signals with the ML score for one text"""
+    text_lower = ctx.lower
+    
+    # Check for safe educational patterns
+    is_safe_query = any(
+        h.start == 0 or text_lower[h.start - 1] == " "
+        for h in ctx.hits_for("narrative.safe")
+    )
     
     # Rule-based detection
-    dangerous_hits = [g for g in DANGEROUS_GOALS if g in text_lower]
-    deceptive_hits = [f for f in DECEPTIVE_FRAMING if f in text_lower]
+    dangerous_hits = ctx.matched("narrative.goal")
+    deceptive_hits = ctx.matched("narrative.framing")
     
     # Combined signal
     signals = dangerous_hits + deceptive_hits
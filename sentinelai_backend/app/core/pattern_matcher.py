@@ -0,0 +1,138 @@
+"""
+Single-pass multi-pattern matcher shared by all keyword brains.
+
+Each brain registers its phrase lists under a tag (e.g. "injection.attack").
+All registered phrases are compiled into one Aho-Corasick automaton, so a
+single pass over the lowercased text returns every hit with its offsets.
+Cost per prompt is linear in text length plus the number of hits, and does
+not grow with the number of registered patterns.
+"""
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class Match(NamedTuple):
+    tag: str
+    pattern: str
+    index: int   # position of the pattern in the list registered under `tag`
+    start: int   # offsets into the scanned (lowercased) text
+    end: int
+
+
+class PatternMatcher:
+    """Aho-Corasick automaton over tagged phrase lists, rebuilt lazily on change"""
+
+    def __init__(self):
+        self._patterns: Dict[str, List[str]] = {}
+        self._automaton = None
+        self._lock = threading.Lock()
+        self.version = 0  # bumped on every register() so callers can invalidate memoized hits
+
+    def register(self, tag: str, patterns: Iterable[str]):
+        """Register (or replace) the phrase list for a tag"""
+        with self._lock:
+            self._patterns[tag] = [p.lower() for p in patterns if p]
+            self._automaton = None
+            self.version += 1
+
+    def patterns(self, tag: str) -> List[str]:
+        return list(self._patterns.get(tag, []))
+
+    def tags(self) -> List[str]:
+        return list(self._patterns)
+
+    def max_length(self) -> int:
+        """Length of the longest registered pattern"""
+        return max((len(p) for patterns in self._patterns.values() for p in patterns), default=0)
+
+    def _build(self):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[Tuple[int, str, str, int]]] = [[]]
+
+        for tag, patterns in self._patterns.items():
+            for index, pattern in enumerate(patterns):
+                state = 0
+                for ch in pattern:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        outputs.append([])
+                    state = nxt
+                outputs[state].append((len(pattern), tag, pattern, index))
+
+        # Breadth-first pass to compute failure links and merge outputs
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+        return goto, fail, [tuple(o) for o in outputs]
+
+    def _get_automaton(self):
+        automaton = self._automaton
+        if automaton is None:
+            with self._lock:
+                if self._automaton is None:
+                    self._automaton = self._build()
+                automaton = self._automaton
+        return automaton
+
+    def feed(self, text: str, state: int = 0, offset: int = 0) -> Tuple[List[Match], int]:
+        """
+        Advance the automaton over `text` starting from `state`.
+
+        Returns the hits found and the final state. `offset` is added to the
+        reported positions so callers can scan a longer text piece by piece.
+        """
+        goto, fail, outputs = self._get_automaton()
+        hits = []
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                end = offset + i + 1
+                for length, tag, pattern, index in outputs[state]:
+                    hits.append(Match(tag, pattern, index, end - length, end))
+        return hits, state
+
+    def scan(self, text: str) -> List[Match]:
+        """Return every hit of every registered pattern in `text`"""
+        return self.feed(text)[0]
+
+
+# Shared automaton used by detector, narrative, ethics, intent and llm guard
+_matcher = PatternMatcher()
+
+
+def register_patterns(tag: str, patterns: Iterable[str]):
+    _matcher.register(tag, patterns)
+
+
+def scan_text(text_lower: str) -> List[Match]:
+    """Scan already-lowercased text once against every registered brain list"""
+    return _matcher.scan(text_lower)
+
+
+def get_matcher() -> PatternMatcher:
+    return _matcher
+
+
+def hits_for(hits: List[Match], tag: str) -> List[Match]:
+    return [h for h in hits if h.tag == tag]
+
+
+def matched_patterns(hits: List[Match], tag: str) -> List[str]:
+    """Distinct patterns hit for a tag, in the order they were registered"""
+    found = {h.index: h.pattern for h in hits if h.tag == tag}
+    return [found[i] for i in sorted(found)]
@@ -1,4 +1,5 @@
 import re
+from app.core.regex_engine import PatternSet
 
 INJECTION_PATTERNS = [
     r"ignore.*instructions",
@@ -19,19 +20,14 @@ INJECTION_PATTERNS = [
     r"unrestricted"
 ]
 
+# All patterns compiled once into a single case-insensitive bounded-window alternation
+_INJECTION_SET = PatternSet([(p, p) for p in INJECTION_PATTERNS], flags=re.IGNORECASE)
+
+def scan_and_sanitize(text: str):
+    """Find every injection pattern and build the sanitized prompt in a single pass"""
+    cleaned, matches = _INJECTION_SET.sub(text, "[BLOCKED]")
+    return {"sanitized": cleaned, "matches": matches}
+
 def sanitize_prompt(text: str):
     """Remove injection attack patterns from prompt"""
-    cleaned = text
-    
-    # Remove each pattern
-    for pattern in INJECTION_PATTERNS:
-        cleaned = re.sub(pattern, "[BLOCKED]", cleaned, flags=re.IGNORECASE)
-    
-    # Also convert to lowercase for second pass to catch variants
-    if cleaned == text:  # If nothing removed, try lowercase patterns
-        text_lower = text.lower()
-        for pattern in INJECTION_PATTERNS:
-            if re.search(pattern, text_lower):
-                cleaned = re.sub(pattern, "[BLOCKED]", cleaned, flags=re.IGNORECASE)
-    
-    return cleaned if cleaned != text else text
+    return scan_and_sanitize(text)["sanitized"]
@@ -0,0 +1,91 @@
+"""
+Compiled pattern sets for the regex-based guards (ethics_guardian, prompt_sanitizer).
+
+Each guard's patterns are compiled once into a single named-group
+alternation, so one pass over the text yields every match together with
+the pattern that produced it. Unbounded gaps such as `ignore.*instructions`
+are rewritten to bounded windows (`.{0,MAX_GAP}`), which caps backtracking
+per start position and keeps worst-case cost linear in text length even on
+long adversarial inputs full of "ignore".
+"""
+import os
+import re
+from typing import Dict, List, Tuple
+
+# Widest gap allowed between the two halves of a pattern like `ignore.*instructions`
+MAX_GAP = int(os.getenv("REGEX_MAX_GAP", "200"))
+
+_UNBOUNDED = [
+    (re.compile(r"(?<!\\)\.\*"), ".{{0,{n}}}"),
+    (re.compile(r"(?<!\\)\.\+"), ".{{1,{n}}}"),
+    (re.compile(r"\\s\*"), r"\\s{{0,{n}}}"),
+    (re.compile(r"\\s\+"), r"\\s{{1,{n}}}"),
+]
+
+
+def bound_gaps(pattern: str, max_gap: int = MAX_GAP) -> str:
+    """Rewrite unbounded `.*`, `.+`, `\\s*` and `\\s+` gaps into bounded windows"""
+    for unbounded, bounded in _UNBOUNDED:
+        pattern = unbounded.sub(bounded.format(n=max_gap), pattern)
+    return pattern
+
+
+class PatternSet:
+    """A list of (regex, name) pairs compiled into one bounded-window alternation"""
+
+    def __init__(self, patterns: List[Tuple[str, str]], flags: int = 0, max_gap: int = MAX_GAP):
+        self.names = [name for _, name in patterns]
+        self.sources = [regex for regex, _ in patterns]
+        alternation = "|".join(
+            f"(?P<p{i}>{bound_gaps(regex, max_gap)})" for i, regex in enumerate(self.sources)
+        )
+        self.regex = re.compile(alternation, flags)
+        # Each pattern on its own, to find every pattern that matches at a shared start
+        self.compiled = [re.compile(bound_gaps(regex, max_gap), flags) for regex in self.sources]
+
+    def _index(self, match) -> int:
+        return int(match.lastgroup[1:])
+
+    def first_matches(self, text: str) -> Dict[int, re.Match]:
+        """
+        First match of every pattern that occurs in `text`, keyed by pattern index.
+
+        Matches may overlap: after each hit the search resumes one character
+        after its start, so a pattern starting inside another's match is still
+        found. The alternation only reports the lowest-index pattern at a
+        given start, so the later patterns not yet found are retried there
+        one by one. Stops early once every pattern has been seen.
+        """
+        found: Dict[int, re.Match] = {}
+        pos = 0
+        search = self.regex.search
+        while len(found) < len(self.sources):
+            match = search(text, pos)
+            if match is None:
+                break
+            start, first = match.start(), self._index(match)
+            found.setdefault(first, match)
+            for i in range(first + 1, len(self.sources)):
+                if i not in found:
+                    other = self.compiled[i].match(text, start)
+                    if other is not None:
+                        found[i] = other
+            pos = start + 1
+        return found
+
+    def sub(self, text: str, repl: str) -> Tuple[str, List[dict]]:
+        """Replace every (non-overlapping) match in one pass; return the text and the matches"""
+        matches = []
+
+        def _record(match):
+            i = self._index(match)
+            matches.append({
+                "pattern": self.sources[i],
+                "name": self.names[i],
+                "match": match.group(),
+                "start": match.start(),
+                "end": match.end()
+            })
+            return repl
+
+        return self.regex.sub(_record, text), matches
@@ -0,0 +1,96 @@
+"""
+Per-request scan context shared by every brain.
+
+A ScanContext is created once per request and handed to each detector.
+Normalized text, tokens, word n-grams, matcher hits, TF-IDF vectors and
+the sentence embedding are computed lazily on first use and memoized, so
+an endpoint that runs several brains pays for each preprocessing step at
+most once.
+"""
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+from app.core import featurizer
+from app.core.pattern_matcher import Match, get_matcher, scan_text, hits_for, matched_patterns
+
+# Same token pattern TfidfVectorizer uses by default
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+class ScanContext:
+    def __init__(self, text: str):
+        self.text = text
+        self._memo: Dict[Any, Any] = {}
+
+    def memo(self, key, compute: Callable[[], Any]):
+        """Return the memoized value for `key`, computing it on first use"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def has(self, key) -> bool:
+        return key in self._memo
+
+    def set(self, key, value):
+        """Store a value computed elsewhere (e.g. as part of a batched call)"""
+        self._memo[key] = value
+
+    @property
+    def lower(self) -> str:
+        return self.memo("lower", self.text.lower)
+
+    @property
+    def stripped(self) -> str:
+        return self.memo("stripped", self.text.strip)
+
+    @property
+    def tokens(self) -> List[str]:
+        return self.memo("tokens", lambda: TOKEN_PATTERN.findall(self.lower))
+
+    @property
+    def ngrams(self) -> List[Counter]:
+        """Word n-gram counts (n = 1..NGRAM_MAX) shared by every TF-IDF brain"""
+        return self.memo("ngrams", lambda: featurizer.ngram_counts(self.tokens))
+
+    @property
+    def hits(self) -> List[Match]:
+        """Every keyword-brain hit in the lowercased text, from one matcher pass"""
+        # Keyed on the matcher version so a brain registered later is still seen
+        return self.memo(("hits", get_matcher().version), lambda: scan_text(self.lower))
+
+    def hits_for(self, tag: str) -> List[Match]:
+        return self.memo(("hits", get_matcher().version, tag), lambda: hits_for(self.hits, tag))
+
+    def matched(self, tag: str) -> List[str]:
+        return self.memo(("matched", get_matcher().version, tag), lambda: matched_patterns(self.hits, tag))
+
+    def tfidf(self, name: str, vectorizer):
+        """Sparse TF-IDF row for this text under the named brain's vectorizer"""
+        return self.memo(("tfidf", name), lambda: featurizer.transform([self], vectorizer))
+
+    def embedding(self, encode: Callable[[str], Any]):
+        """Sentence embedding of the lowercased text"""
+        return self.memo("embedding", lambda: encode(self.lower))
+
+
+def ensure_contexts(texts: List[str], contexts: List[ScanContext] = None) -> List[ScanContext]:
+    """Reuse caller-supplied contexts, or create one per text"""
+    if contexts is None:
+        return [ScanContext(t) for t in texts]
+    return [c if c is not None else ScanContext(t) for t, c in zip(texts, contexts)]
+
+
+def prime_tfidf(contexts: List[ScanContext], name: str, vectorizer):
+    """
+    Vectorize every context that has no memoized row for `name` with a
+    single sparse transform, then return the stacked matrix for all of them.
+    """
+    from scipy.sparse import vstack
+
+    missing = [c for c in contexts if not c.has(("tfidf", name))]
+    if missing:
+        X = featurizer.transform(missing, vectorizer)
+        for i, c in enumerate(missing):
+            c.set(("tfidf", name), X[i])
+    return vstack([c.tfidf(name, vectorizer) for c in contexts], format="csr")
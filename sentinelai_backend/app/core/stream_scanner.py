@@ -0,0 +1,115 @@
+"""
+Incremental scanning of streamed LLM output.
+
+A StreamScanner feeds each new chunk of a response through the shared
+Aho-Corasick automaton, carrying the automaton state across chunks, so a
+token costs O(len(chunk)) instead of a rescan of the whole response, and
+a pattern split over several chunks is still found the moment its last
+character arrives.
+
+`guard_stream` wraps a chunk iterator: it forwards text as it comes,
+holding back only the last (longest pattern - 1) characters so that a
+block-level pattern is never forwarded in full. When one completes, the
+text before it is released, a notice is appended and the stream is cut.
+"""
+from typing import Iterable, Iterator, List
+
+from app.core.pattern_matcher import Match, get_matcher, register_patterns
+
+# Data that must never leave through model output (matched lowercased)
+EXFILTRATION_PATTERNS = [
+    "-----begin rsa private key",
+    "-----begin openssh private key",
+    "-----begin private key",
+    "aws_secret_access_key",
+    "aws_access_key_id",
+    "api_key=",
+    "api key:",
+    "secret_key",
+    "private_key",
+    "access_token",
+    "password:",
+    "passwd:",
+    "ssn:",
+    "credit card number:",
+    "my system prompt is",
+    "system prompt:",
+    "here are my instructions",
+    "internal use only",
+]
+
+register_patterns("output.exfiltration", EXFILTRATION_PATTERNS)
+
+# Tags whose hits cut the stream
+BLOCK_TAGS = ("output.exfiltration",)
+
+BLOCK_NOTICE = "\n[SentinelAI] Response blocked: sensitive data detected in model output"
+
+
+def _lower_aligned(chunk: str) -> str:
+    """Lowercase without changing length, so hit offsets index the original stream"""
+    lowered = chunk.lower()
+    if len(lowered) == len(chunk):
+        return lowered
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in chunk)
+
+
+class StreamScanner:
+    """Matcher state for one streamed response"""
+
+    def __init__(self, block_tags=BLOCK_TAGS):
+        self.block_tags = set(block_tags)
+        self.matcher = get_matcher()
+        self.version = self.matcher.version
+        self.state = 0
+        self.chars = 0  # characters scanned so far = offset of the next chunk
+        self.hits: List[Match] = []
+        self.blocked = False
+
+    def feed(self, chunk: str) -> List[Match]:
+        """Scan the next chunk; returns the block-level hits completed inside it"""
+        if self.matcher.version != self.version:
+            # Patterns were re-registered mid-stream: the old state is meaningless
+            self.version, self.state = self.matcher.version, 0
+        hits, self.state = self.matcher.feed(_lower_aligned(chunk), self.state, self.chars)
+        self.chars += len(chunk)
+        blocking = [h for h in hits if h.tag in self.block_tags]
+        self.hits.extend(blocking)
+        if blocking:
+            self.blocked = True
+        return blocking
+
+    def holdback(self) -> int:
+        """Characters to keep unforwarded so no block pattern is released in full"""
+        longest = max((len(p) for tag in self.block_tags for p in self.matcher.patterns(tag)), default=1)
+        return longest - 1
+
+
+def guard_stream(chunks: Iterable[str], scanner: StreamScanner = None) -> Iterator[str]:
+    """Forward `chunks` while scanning them; cut the stream when a block-level pattern completes"""
+    scanner = scanner or StreamScanner()
+    holdback = scanner.holdback()
+    pending, released = "", 0  # pending starts at absolute offset `released`
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            hits = scanner.feed(chunk)
+            pending += chunk
+            if hits:
+                cut = min(h.start for h in hits) - released
+                if cut > 0:
+                    yield pending[:cut]
+                yield BLOCK_NOTICE
+                print(f"[WARN] LLM output stream cut: {sorted({h.pattern for h in hits})}")
+                return
+            if len(pending) > holdback:
+                ready = len(pending) - holdback
+                yield pending[:ready]
+                pending, released = pending[ready:], released + ready
+        if pending:
+            yield pending
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
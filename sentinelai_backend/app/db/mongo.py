@@ -8,3 +8,4 @@ client = MongoClient(mongo_uri)
 
 db = client[mongo_db_name]
 attack_logs = db["attack_logs"]
+metrics_rollups = db["metrics_rollups"]
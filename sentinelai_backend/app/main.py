@@ -1,5 +1,9 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.v1 import routes_detect, routes_tools, routes_ws, routes_llm, routes_policy, routes_metrics, routes_simulator, routes_security
 
 # Try to import vision router (optional)
@@ -12,8 +16,35 @@ except Exception as e:
     vision_router = None
 
 from app.api.v1 import routes_security
+from app.core.warmup import EAGER_WARMUP, warmup, mark_ready, readiness
+from app.services.detection_pool import DetectionOverloaded, get_detection_pool
+from app.services.audit_writer import drain_audit_writer
+from app.services.redis_cache import close_redis
+
+# Kafka is optional (confluent_kafka may not be installed)
+try:
+    from app.services.kafka_producer import shutdown_producer
+except Exception:
+    shutdown_producer = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the brains off the event loop so the port opens immediately;
+    # /ready stays 503 until warm-up has finished
+    if EAGER_WARMUP:
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warmup))
+    else:
+        mark_ready()
+    yield
+    await drain_audit_writer()
+    if shutdown_producer:
+        await asyncio.to_thread(shutdown_producer)  # deliver what the audit writer produced
+    get_detection_pool().shutdown()
+    await close_redis()
 
-app = FastAPI(title="SentinelAI Firewall")
+
+app = FastAPI(title="SentinelAI Firewall", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -24,6 +55,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(DetectionOverloaded)
+async def detection_overloaded(request, exc: DetectionOverloaded):
+    # 429 = queue full, 503 = waited too long for a worker; both are retryable
+    return JSONResponse({"error": exc.detail, "status": "overloaded"}, status_code=exc.status_code,
+                        headers={"Retry-After": "1"})
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe for the load balancer: 200 once all brains are loaded"""
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
 app.include_router(routes_detect.router, prefix="/api/v1/detect")
 app.include_router(routes_tools.router, prefix="/api/v1/tools")
 app.include_router(routes_ws.router)   # ← THIS LINE WAS MISSING
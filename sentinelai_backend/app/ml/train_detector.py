@@ -1,7 +1,10 @@
 import os
+import sys
+import json
 import joblib
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 
@@ -12,6 +15,9 @@ DATA_PATH = os.path.join(DATA_DIR, "prompt_attack_corpus.csv")
 ML_DIR = os.path.join(SCRIPT_DIR)
 os.makedirs(ML_DIR, exist_ok=True)
 
+# Hash buckets for the hashed-feature models (must match the server's HASHED_N_FEATURES)
+HASHED_N_FEATURES = int(os.getenv("HASHED_N_FEATURES", str(2 ** 18)))
+
 # External ethics datasets
 ETHICS_DATASETS = [
     r"C:\Saalu_Data\cybersecurity\datasets\ethics_brain\abusive_lang.csv",
@@ -24,7 +30,7 @@ NARRATIVE_DATASETS = [
     r"C:\Saalu_Data\cybersecurity\datasets\narrative_brain\SPAM_SMS.csv"
 ]
 
-def train_injection():
+def load_injection_data():
     data_path = os.path.normpath(DATA_PATH)
     
     if not os.path.exists(data_path):
@@ -36,6 +42,10 @@ def train_injection():
     
     X = df["text"].astype(str).values
     y = df["label"].astype(str).values
+    return X, y
+
+def train_injection():
+    X, y = load_injection_data()
 
     pipe = Pipeline([
         ("tfidf", TfidfVectorizer(lowercase=True, ngram_range=(1, 2))),
@@ -48,9 +58,9 @@ def train_injection():
     print(f"[Injection] Saved pipeline to {out}")
     print(f"[Injection] Classes: {pipe.named_steps['clf'].classes_}")
 
-def train_ethics():
+def load_ethics_data():
     """
-    Train ethics model from three datasets:
+    Load the ethics training data from three datasets:
     - abusive_lang.csv
     - hate_speech.csv
     - toxic_comments.csv
@@ -96,9 +106,11 @@ def train_ethics():
     print(f"[Ethics] Total samples: {len(all_texts)}")
     print(f"[Ethics] Unethical samples: {sum(all_labels)}")
     print(f"[Ethics] Safe samples: {len(all_labels) - sum(all_labels)}")
-    
-    X = all_texts
-    y = all_labels
+    return all_texts, all_labels
+
+def train_ethics():
+    """Train the ethics model (TF-IDF 1-3 grams + logistic regression)"""
+    X, y = load_ethics_data()
     
     # Train vectorizer with trigrams to catch deceptive patterns
     vectorizer = TfidfVectorizer(lowercase=True, ngram_range=(1, 3), max_features=5000)
@@ -117,9 +129,9 @@ def train_ethics():
     print(f"[Ethics] Saved vectorizer to {vec_out}")
     print(f"[Ethics] Classes: {model.classes_}")
 
-def train_narrative():
+def load_narrative_data():
     """
-    Train narrative model to detect:
+    Load the narrative training data, used to detect:
     - Spam messages
     - Phishing attempts
     - Social engineering
@@ -184,9 +196,11 @@ def train_narrative():
     print(f"[Narrative] Total samples: {len(all_texts)}")
     print(f"[Narrative] Malicious samples: {sum(all_labels)}")
     print(f"[Narrative] Safe samples: {len(all_labels) - sum(all_labels)}")
-    
-    X = all_texts
-    y = all_labels
+    return all_texts, all_labels
+
+def train_narrative():
+    """Train the narrative model (TF-IDF 1-3 grams + logistic regression)"""
+    X, y = load_narrative_data()
     
     # Train vectorizer with character-level features to catch obfuscation
     vectorizer = TfidfVectorizer(
@@ -210,14 +224,63 @@ def train_narrative():
     print(f"[Narrative] Saved vectorizer to {vec_out}")
     print(f"[Narrative] Classes: {model.classes_}")
 
+def train_hashed(name, X, y, ngram_range, positive, class_weight=None):
+    """
+    Train a brain on hashed n-gram features and save plain float32 arrays
+    (<name>_hashed_coef.npy, <name>_hashed_idf.npy, <name>_hashed.json)
+    that the server memory-maps instead of unpickling a vocabulary.
+    """
+    hasher = HashingVectorizer(
+        lowercase=True,
+        ngram_range=ngram_range,
+        n_features=HASHED_N_FEATURES,
+        alternate_sign=False,
+        norm=None
+    )
+    tfidf = TfidfTransformer()
+    X_vec = tfidf.fit_transform(hasher.transform(X))
+
+    model = LogisticRegression(max_iter=1000, class_weight=class_weight)
+    model.fit(X_vec, y)
+
+    # Orient the weights so that sigmoid(x . coef + intercept) = P(positive)
+    sign = 1.0 if list(model.classes_).index(positive) == 1 else -1.0
+    coef = (sign * model.coef_[0]).astype(np.float32)
+    intercept = float(sign * model.intercept_[0])
+
+    np.save(os.path.join(ML_DIR, f"{name}_hashed_coef.npy"), coef)
+    np.save(os.path.join(ML_DIR, f"{name}_hashed_idf.npy"), tfidf.idf_.astype(np.float32))
+    with open(os.path.join(ML_DIR, f"{name}_hashed.json"), "w") as f:
+        json.dump({
+            "n_features": HASHED_N_FEATURES,
+            "ngram_range": list(ngram_range),
+            "intercept": intercept,
+            "positive": str(positive),
+            "norm": "l2",
+            "sublinear_tf": False
+        }, f, indent=2)
+    print(f"[{name}] Saved hashed model ({HASHED_N_FEATURES} features, {np.count_nonzero(coef)} non-zero weights)")
+
+def train_all_hashed():
+    X, y = load_injection_data()
+    train_hashed("injection", X, y, (1, 2), positive="injection")
+    X, y = load_ethics_data()
+    train_hashed("ethics", X, y, (1, 3), positive=1, class_weight="balanced")
+    X, y = load_narrative_data()
+    train_hashed("narrative", X, y, (1, 3), positive=1, class_weight="balanced")
+
 def main():
     print("=" * 60)
     print("Training SentinelAI Models - 3 Brains")
     print("=" * 60)
     
-    train_injection()
-    train_ethics()
-    train_narrative()
+    if "--hashed" in sys.argv:
+        # Stateless hashed-feature models served with FEATURE_MODE=hashed
+        train_all_hashed()
+    else:
+        train_injection()
+        train_ethics()
+        train_narrative()
     
     print("\n" + "=" * 60)
     print("All 3 brains trained successfully!")
@@ -0,0 +1,188 @@
+"""
+Background writer for the audit trail.
+
+`enqueue(event)` puts an event on a bounded queue and returns at once; a
+single writer task drains the queue in batches of up to AUDIT_FLUSH_SIZE
+events, or whatever arrived within AUDIT_FLUSH_INTERVAL seconds of the
+first one, and hands each batch to `write_batch` (sync, run in a thread:
+MongoDB insert_many, batched Kafka produce) and then to `after_write`
+(async, e.g. the WebSocket broadcast). Request latency no longer depends
+on MongoDB or Kafka. `write_batch` reports how many events of the batch
+it failed to persist; those count as failed, the rest as written.
+
+When the queue is full, AUDIT_OVERFLOW decides:
+- "drop_new"    the new event is dropped (default; never slows a request)
+- "drop_oldest" the oldest queued event makes room for the new one
+- "block"       the request waits up to AUDIT_BLOCK_TIMEOUT for room, then drops
+
+Drops are counted, never silent. `drain()` flushes what is queued at
+shutdown and reports queued plus in-flight events it could not write. The writer starts lazily on the first event, inside whatever
+event loop is running.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))  # seconds
+AUDIT_OVERFLOW = os.getenv("AUDIT_OVERFLOW", "drop_new")
+AUDIT_BLOCK_TIMEOUT = float(os.getenv("AUDIT_BLOCK_TIMEOUT", "0.05"))
+AUDIT_DRAIN_TIMEOUT = float(os.getenv("AUDIT_DRAIN_TIMEOUT", "10"))
+
+OVERFLOW_POLICIES = ("drop_new", "drop_oldest", "block")
+
+
+class AuditWriter:
+    def __init__(self, write_batch: Callable[[List[dict]], Optional[Tuple[List[dict], int]]],
+                 after_write: Callable[[List[dict]], Awaitable] = None, queue_size: int = AUDIT_QUEUE_SIZE,
+                 flush_size: int = AUDIT_FLUSH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 overflow: str = AUDIT_OVERFLOW):
+        if overflow not in OVERFLOW_POLICIES:
+            print(f"[WARN] Unknown AUDIT_OVERFLOW={overflow!r}, using drop_new")
+            overflow = "drop_new"
+        # Returns (events to pass on to after_write, number that failed to persist), or None: all written
+        self.write_batch = write_batch
+        self.after_write = after_write
+        self.queue_size = max(1, queue_size)
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self._writing = 0  # events of the batch currently in write_batch
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue(self.queue_size)
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    async def enqueue(self, event: dict) -> bool:
+        """Queue one event for the writer; False if the overflow policy dropped it"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if self.overflow == "drop_oldest":
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._queue.put_nowait(event)
+                self.dropped += 1
+            elif self.overflow == "block":
+                try:
+                    await asyncio.wait_for(self._queue.put(event), AUDIT_BLOCK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.dropped += 1
+                    return False
+            else:
+                self.dropped += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    async def _next_batch(self) -> List[dict]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            start = time.perf_counter()
+            self._writing = len(batch)
+            try:
+                result = await asyncio.to_thread(self.write_batch, batch)
+                passed, failed = result if result is not None else (batch, 0)
+                self.failed += failed
+                self.written += len(batch) - failed
+                self._writing = 0
+                if self.after_write:
+                    await self.after_write(passed)
+            except Exception as e:
+                if self._writing:
+                    self.failed += len(batch)
+                print(f"[WARN] Audit batch of {len(batch)} failed: {e}")
+            finally:
+                self._writing = 0
+                self.batches += 1
+                self.last_batch_ms = round((time.perf_counter() - start) * 1000, 2)
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def drain(self, timeout: float = AUDIT_DRAIN_TIMEOUT):
+        """Write out everything queued (up to `timeout` seconds) and stop the writer"""
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        pending = self._queue.qsize() + self._writing
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            # The in-flight batch keeps running in its thread after the cancel, but is not waited for
+            print(f"[WARN] Audit drain timed out, {self._queue.qsize() + self._writing} of {pending} events "
+                  f"not written ({self._writing} in flight)")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._writing,
+            "queue_size": self.queue_size,
+            "flush_size": self.flush_size,
+            "flush_interval_s": self.flush_interval,
+            "overflow": self.overflow,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "last_batch_ms": self.last_batch_ms,
+        }
+
+
+_writer: Optional[AuditWriter] = None
+
+
+def register_audit_writer(writer: AuditWriter) -> AuditWriter:
+    global _writer
+    _writer = writer
+    return writer
+
+
+async def drain_audit_writer(timeout: float = AUDIT_DRAIN_TIMEOUT):
+    if _writer is not None:
+        await _writer.drain(timeout)
+
+
+def audit_writer_stats() -> dict:
+    return _writer.stats() if _writer is not None else {"running": False, "registered": False}
@@ -0,0 +1,133 @@
+"""
+Bounded worker pool for CPU-bound detection.
+
+Embedding, TF-IDF and regex work runs on a fixed-size thread pool instead
+of the asyncio event loop, so one slow scan no longer stalls every other
+request and WebSocket on the worker. NumPy, scikit-learn and torch release
+the GIL in their kernels, so threads overlap well without copying models
+into extra processes.
+
+Admission control:
+- more than DETECTION_WORKERS + DETECTION_MAX_QUEUE jobs in flight -> 429
+- a job that waited longer than DETECTION_QUEUE_TIMEOUT before a worker
+  picked it up is dropped -> 503 (the client has likely given up)
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+DETECTION_MAX_QUEUE = int(os.getenv("DETECTION_MAX_QUEUE", "64"))
+DETECTION_QUEUE_TIMEOUT = float(os.getenv("DETECTION_QUEUE_TIMEOUT", "10"))
+
+# Number of recent jobs kept for the wait/run time percentiles
+_SAMPLES = 1000
+
+
+class DetectionOverloaded(Exception):
+    """Raised when a detection job is refused; carries the HTTP status to return"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class DetectionPool:
+    def __init__(self, workers: int = DETECTION_WORKERS, max_queue: int = DETECTION_MAX_QUEUE,
+                 queue_timeout: float = DETECTION_QUEUE_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="detect")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._waits = deque(maxlen=_SAMPLES)
+        self._runs = deque(maxlen=_SAMPLES)
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise DetectionOverloaded(429, "Detection queue full, retry later")
+            self._in_flight += 1
+        submitted = time.perf_counter()
+
+        def _job():
+            started = time.perf_counter()
+            waited = started - submitted
+            with self._lock:
+                self._waits.append(waited)
+                if waited > self.queue_timeout:
+                    self.timed_out += 1
+                    raise DetectionOverloaded(503, "Detection queue wait exceeded, retry later")
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._runs.append(time.perf_counter() - started)
+
+        def _release(_future):
+            # Runs when the job finishes (or is cancelled before it starts), not when
+            # the caller stops waiting: a cancelled request's job still holds its slot
+            with self._lock:
+                self._in_flight -= 1
+                self.completed += 1
+
+        future = self._executor.submit(_job)
+        future.add_done_callback(_release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = np.array(self._waits) * 1000
+            runs = np.array(self._runs) * 1000
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": max(0, self._in_flight - self._running),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "wait_ms": _percentiles(waits),
+                "run_ms": _percentiles(runs),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _percentiles(samples: np.ndarray) -> dict:
+    if not len(samples):
+        return {"avg": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "avg": round(float(samples.mean()), 2),
+        "p50": round(float(np.percentile(samples, 50)), 2),
+        "p99": round(float(np.percentile(samples, 99)), 2),
+        "max": round(float(samples.max()), 2),
+    }
+
+
+_pool = DetectionPool()
+
+
+def get_detection_pool() -> DetectionPool:
+    return _pool
+
+
+async def run_detection(fn, *args, **kwargs):
+    """Run a detection function on the shared pool (raises DetectionOverloaded)"""
+    return await _pool.run(fn, *args, **kwargs)
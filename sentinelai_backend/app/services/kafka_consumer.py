@@ -1,37 +1,391 @@
-import os, json
-from confluent_kafka import Consumer
+"""
+Windowed streaming analytics over sentinel.attacks.
+
+AnalyticsConsumer reads the audit events in batches (`consume`) and
+aggregates them by event time into tumbling windows of
+ANALYTICS_WINDOW_S seconds: counts per decision and per triggering
+brain, plus a fixed-bin risk histogram (RISK_BINS bins over [0, 1]) from
+which quantiles are read. Histograms merge by addition, so the sliding
+view (the last ANALYTICS_SLIDING_S seconds, one window step at a time)
+is just the sum of the windows it covers.
+
+A window is flushed to the sink once the partition's watermark (highest
+event timestamp seen) passes its end by ANALYTICS_LATENESS_S; events
+older than that are counted as late and skipped. After a flush, and at
+least every ANALYTICS_SNAPSHOT_S, each partition's open windows and next
+offset are written to ANALYTICS_STATE_DIR and that offset is committed
+(auto-commit is off). A restart restores the open windows and resumes
+right after the last snapshot instead of reprocessing from `earliest`.
+
+State is kept per partition, so consumers in one group scale across the
+topic's partitions. When a partition is revoked its open windows are
+flushed as partial aggregates before the commit, and the new owner
+starts empty. Sink records are therefore additive: sum records with the
+same window_start to get the group-wide window.
+
+Run with `python -m app.services.kafka_consumer`.
+"""
+import json
+import os
+import signal
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from confluent_kafka import Consumer, KafkaError, TopicPartition
 from dotenv import load_dotenv
-from collections import defaultdict
 
 load_dotenv()
 
-conf = {
-    "bootstrap.servers": os.getenv("KAFKA_BOOTSTRAP"),
-    "security.protocol": "SASL_SSL",
-    "sasl.mechanisms": "PLAIN",
-    "sasl.username": os.getenv("KAFKA_API_KEY"),
-    "sasl.password": os.getenv("KAFKA_API_SECRET"),
-    "group.id": "sentinelai-analytics",
-    "auto.offset.reset": "earliest"
-}
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ANALYTICS_TOPIC = os.getenv("KAFKA_TOPIC", "sentinel.attacks")
+ANALYTICS_GROUP = os.getenv("ANALYTICS_GROUP", "sentinelai-analytics")
+ANALYTICS_BATCH = int(os.getenv("ANALYTICS_BATCH", "500"))
+ANALYTICS_POLL_TIMEOUT = float(os.getenv("ANALYTICS_POLL_TIMEOUT", "1.0"))
+ANALYTICS_WINDOW_S = int(os.getenv("ANALYTICS_WINDOW_S", "60"))
+ANALYTICS_SLIDING_S = int(os.getenv("ANALYTICS_SLIDING_S", "300"))
+ANALYTICS_LATENESS_S = int(os.getenv("ANALYTICS_LATENESS_S", "10"))
+ANALYTICS_SNAPSHOT_S = float(os.getenv("ANALYTICS_SNAPSHOT_S", "30"))
+ANALYTICS_STATE_DIR = os.getenv("ANALYTICS_STATE_DIR", os.path.join(ROOT, "data", "analytics_state"))
+
+RISK_BINS = 100
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _event_fields(event: dict):
+    """(decision, brains, risk or None) for both the /scan and the /security event shapes"""
+    decision = event.get("decision")
+    if isinstance(decision, dict):  # /security logs the whole policy result
+        decision = decision.get("decision")
+    if event.get("risk_lower_bound"):  # cascade skipped tiers: the decision holds, the scores do not
+        return str(decision or "unknown"), [], None
+    brains = [b for b in event.get("triggered_by") or [] if b != "none"]
+    risk = event.get("risk")
+    try:
+        risk = min(max(float(risk), 0.0), 1.0)
+    except (TypeError, ValueError):
+        risk = None
+    return str(decision or "unknown"), brains, risk
+
+
+class WindowAgg:
+    """Counts and risk histogram for one time window"""
+
+    def __init__(self, start: int, size: int):
+        self.start = start
+        self.size = size
+        self.count = 0
+        self.decisions: Dict[str, int] = {}
+        self.brains: Dict[str, int] = {}
+        self.risk_hist = [0] * RISK_BINS
+
+    def add(self, decision: str, brains: List[str], risk: Optional[float]):
+        self.count += 1
+        self.decisions[decision] = self.decisions.get(decision, 0) + 1
+        for brain in brains:
+            self.brains[brain] = self.brains.get(brain, 0) + 1
+        if risk is not None:
+            self.risk_hist[min(int(risk * RISK_BINS), RISK_BINS - 1)] += 1
+
+    def merge(self, other: "WindowAgg"):
+        self.count += other.count
+        for name, n in other.decisions.items():
+            self.decisions[name] = self.decisions.get(name, 0) + n
+        for name, n in other.brains.items():
+            self.brains[name] = self.brains.get(name, 0) + n
+        self.risk_hist = [a + b for a, b in zip(self.risk_hist, other.risk_hist)]
+
+    def quantiles(self) -> Dict[str, Optional[float]]:
+        """Risk quantiles to bin resolution (upper edge of the bin holding the quantile)"""
+        total = sum(self.risk_hist)
+        result = {}
+        for q in QUANTILES:
+            label = f"p{round(q * 100)}"
+            if not total:
+                result[label] = None
+                continue
+            rank, seen = q * total, 0
+            for i, n in enumerate(self.risk_hist):
+                seen += n
+                if seen >= rank:
+                    result[label] = round((i + 1) / RISK_BINS, 4)
+                    break
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "window_start": self.start,
+            "window_end": self.start + self.size,
+            "count": self.count,
+            "decisions": dict(self.decisions),
+            "brains": dict(self.brains),
+            "risk_quantiles": self.quantiles(),
+            "risk_histogram": list(self.risk_hist),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WindowAgg":
+        window = cls(data["window_start"], data["window_end"] - data["window_start"])
+        window.count = data["count"]
+        window.decisions = dict(data["decisions"])
+        window.brains = dict(data["brains"])
+        window.risk_hist = list(data["risk_histogram"])
+        return window
+
+
+class PartitionState:
+    def __init__(self, partition: int, next_offset: int = None):
+        self.partition = partition
+        self.next_offset = next_offset  # first offset not yet folded into `windows`
+        self.watermark = 0
+        self.windows: Dict[int, WindowAgg] = {}
+        self.late = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "partition": self.partition,
+            "next_offset": self.next_offset,
+            "watermark": self.watermark,
+            "late": self.late,
+            "windows": [w.to_dict() for w in self.windows.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PartitionState":
+        state = cls(data["partition"], data["next_offset"])
+        state.watermark = data["watermark"]
+        state.late = data.get("late", 0)
+        for w in data["windows"]:
+            window = WindowAgg.from_dict(w)
+            state.windows[window.start] = window
+        return state
+
+
+def print_window(record: dict):
+    print(f"📊 WINDOW p{record['partition']} {record['window_start']}+{record['window_end'] - record['window_start']}s "
+          f"{'(partial) ' if record['partial'] else ''}n={record['count']} {record['decisions']} "
+          f"brains={record['brains']} risk={record['risk_quantiles']}")
+
+
+class AnalyticsConsumer:
+    def __init__(self, consumer, topic: str = ANALYTICS_TOPIC, sink: Callable[[dict], None] = print_window,
+                 state_dir: str = ANALYTICS_STATE_DIR, window_s: int = ANALYTICS_WINDOW_S,
+                 sliding_s: int = ANALYTICS_SLIDING_S, lateness_s: int = ANALYTICS_LATENESS_S,
+                 snapshot_s: float = ANALYTICS_SNAPSHOT_S, batch: int = ANALYTICS_BATCH,
+                 poll_timeout: float = ANALYTICS_POLL_TIMEOUT):
+        self.consumer = consumer
+        self.topic = topic
+        self.sink = sink  # receives each flushed window (per partition, additive)
+        self.state_dir = state_dir
+        self.window_s = window_s
+        self.sliding_s = sliding_s
+        self.lateness_s = lateness_s
+        self.snapshot_s = snapshot_s
+        self.batch = batch
+        self.poll_timeout = poll_timeout
+        self.partitions: Dict[int, PartitionState] = {}
+        self._recent = deque(maxlen=max(1, sliding_s // window_s) * 64)  # flushed windows, for the sliding view
+        self._last_snapshot = time.monotonic()
+        self._running = False
+        self.consumed = 0
+        self.flushed = 0
+        self.commits = 0
+        self.skipped = 0  # replayed offsets already covered by a snapshot
+        self.errors = 0
+        os.makedirs(state_dir, exist_ok=True)
+
+    # ---- snapshots and offsets --------------------------------------------
+
+    def _snapshot_path(self, partition: int) -> str:
+        return os.path.join(self.state_dir, f"{self.topic}-{partition}.json")
+
+    def _load(self, partition: int, committed: int) -> PartitionState:
+        """Restore a partition's snapshot unless the committed offset is past it (stale)"""
+        path = self._snapshot_path(partition)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    state = PartitionState.from_dict(json.load(f))
+                if state.next_offset is not None and (committed < 0 or state.next_offset >= committed):
+                    print(f"[LOAD] Analytics p{partition}: {len(state.windows)} open window(s), offset {state.next_offset}")
+                    return state
+            except Exception as e:
+                print(f"[WARN] Analytics snapshot {path} unreadable: {e}")
+        return PartitionState(partition, committed if committed >= 0 else None)
+
+    def _snapshot(self, partitions):
+        offsets = []
+        for p in partitions:
+            state = self.partitions[p]
+            if state.next_offset is None:
+                continue
+            path = self._snapshot_path(p)
+            with open(path + ".tmp", "w") as f:
+                json.dump(state.to_dict(), f)
+            os.replace(path + ".tmp", path)  # a crash never leaves a half-written snapshot
+            offsets.append(TopicPartition(self.topic, p, state.next_offset))
+        if offsets:
+            try:
+                self.consumer.commit(offsets=offsets, asynchronous=False)
+                self.commits += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[WARN] Analytics offset commit failed: {e}")
+        self._last_snapshot = time.monotonic()
+
+    def on_assign(self, consumer, partitions):
+        committed = {tp.partition: tp.offset for tp in consumer.committed(partitions)}
+        for tp in partitions:
+            state = self._load(tp.partition, committed.get(tp.partition, -1))
+            self.partitions[tp.partition] = state
+            if state.next_offset is not None:
+                tp.offset = state.next_offset
+        consumer.assign(partitions)
+
+    def on_revoke(self, consumer, partitions):
+        revoked = [tp.partition for tp in partitions if tp.partition in self.partitions]
+        for p in revoked:
+            self._flush(p, everything=True)
+        self._snapshot(revoked)
+        for p in revoked:
+            del self.partitions[p]
+
+    # ---- aggregation ------------------------------------------------------
+
+    def _add(self, partition: int, offset: int, event: dict):
+        state = self.partitions.get(partition)
+        if state is None:  # assigned without on_assign (e.g. a manual assign)
+            state = self.partitions[partition] = PartitionState(partition)
+        if state.next_offset is not None and offset < state.next_offset:
+            self.skipped += 1
+            return
+        state.next_offset = offset + 1
+        self.consumed += 1
+
+        ts = int(event.get("timestamp") or time.time())
+        start = ts - ts % self.window_s
+        if start + self.window_s + self.lateness_s <= state.watermark:
+            state.late += 1
+            return
+        state.watermark = max(state.watermark, ts)
+        window = state.windows.get(start)
+        if window is None:
+            window = state.windows[start] = WindowAgg(start, self.window_s)
+        window.add(*_event_fields(event))
+
+    def _flush(self, partition: int, everything: bool = False) -> int:
+        """Send closed windows (or all of them) to the sink; returns how many were flushed"""
+        state = self.partitions[partition]
+        closed = sorted(start for start in state.windows
+                        if everything or start + self.window_s + self.lateness_s <= state.watermark)
+        for start in closed:
+            window = state.windows.pop(start)
+            self._recent.append(window)
+            record = window.to_dict()
+            record.update({"topic": self.topic, "partition": partition, "partial": everything})
+            self.sink(record)
+            self.flushed += 1
+        return len(closed)
+
+    def process(self, messages) -> int:
+        """Fold a batch of messages in, flush closed windows, snapshot + commit if due"""
+        touched = set()
+        for msg in messages:
+            if msg.error():
+                if msg.error().code() != KafkaError._PARTITION_EOF:
+                    self.errors += 1
+                    print(f"❌ Kafka error: {msg.error()}")
+                continue
+            try:
+                event = json.loads(msg.value().decode("utf-8"))
+            except Exception:
+                self.errors += 1
+                event = {}
+            self._add(msg.partition(), msg.offset(), event)
+            touched.add(msg.partition())
+
+        flushed = [p for p in touched if self._flush(p)]
+        if flushed:
+            self._snapshot(flushed)
+        elif self.partitions and time.monotonic() - self._last_snapshot >= self.snapshot_s:
+            self._snapshot(list(self.partitions))
+        return len(messages)
+
+    # ---- views ------------------------------------------------------------
+
+    def sliding(self) -> dict:
+        """Merged view of the last `sliding_s` seconds (flushed and open windows, all local partitions)"""
+        open_windows = [w for state in self.partitions.values() for w in state.windows.values()]
+        watermark = max((s.watermark for s in self.partitions.values()), default=0)
+        end = watermark - watermark % self.window_s + self.window_s
+        merged = WindowAgg(end - self.sliding_s, self.sliding_s)
+        for window in list(self._recent) + open_windows:
+            if merged.start <= window.start < end:
+                merged.merge(window)
+        return merged.to_dict()
+
+    def stats(self) -> dict:
+        return {
+            "partitions": sorted(self.partitions),
+            "consumed": self.consumed,
+            "skipped": self.skipped,
+            "late": sum(s.late for s in self.partitions.values()),
+            "open_windows": sum(len(s.windows) for s in self.partitions.values()),
+            "flushed_windows": self.flushed,
+            "commits": self.commits,
+            "errors": self.errors,
+        }
+
+    # ---- loop -------------------------------------------------------------
+
+    def run(self, max_idle_polls: int = None):
+        """Consume until stop() (or `max_idle_polls` empty batches in a row), then snapshot and close"""
+        self.consumer.subscribe([self.topic], on_assign=self.on_assign, on_revoke=self.on_revoke)
+        self._running = True
+        idle = 0
+        try:
+            while self._running:
+                messages = self.consumer.consume(num_messages=self.batch, timeout=self.poll_timeout)
+                self.process(messages)
+                idle = 0 if messages else idle + 1
+                if max_idle_polls is not None and idle >= max_idle_polls:
+                    break
+        finally:
+            self.close()
+
+    def stop(self):
+        self._running = False
 
-consumer = Consumer(conf)
-consumer.subscribe(["sentinel.attacks"])
+    def close(self):
+        """Snapshot + commit every owned partition (open windows stay open for the restart), then leave the group"""
+        if self.partitions:
+            self._snapshot(list(self.partitions))
+        self.consumer.close()
 
-attack_counts = defaultdict(int)
 
-print("📡 Kafka Analytics Consumer started...")
+def kafka_config() -> dict:
+    return {
+        "bootstrap.servers": os.getenv("KAFKA_BOOTSTRAP"),
+        "security.protocol": "SASL_SSL",
+        "sasl.mechanisms": "PLAIN",
+        "sasl.username": os.getenv("KAFKA_API_KEY"),
+        "sasl.password": os.getenv("KAFKA_API_SECRET"),
+        "group.id": ANALYTICS_GROUP,
+        "auto.offset.reset": "earliest",  # only used when a partition has no commit yet
+        "enable.auto.commit": False,
+    }
 
-while True:
-    msg = consumer.poll(1.0)
-    if msg is None:
-        continue
-    if msg.error():
-        print("❌ Kafka error:", msg.error())
-        continue
 
-    event = json.loads(msg.value().decode("utf-8"))
+def main():
+    analytics = AnalyticsConsumer(Consumer(kafka_config()))
+    signal.signal(signal.SIGTERM, lambda *_: analytics.stop())
+    print("📡 Kafka Analytics Consumer started...")
+    try:
+        analytics.run()
+    except KeyboardInterrupt:
+        pass
+    print("📊 Analytics consumer stopped:", analytics.stats())
 
-    attack_counts[event["decision"]] += 1
 
-    print("📊 LIVE METRICS:", dict(attack_counts))
+if __name__ == "__main__":
+    main()
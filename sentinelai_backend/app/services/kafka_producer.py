@@ -4,43 +4,83 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# High-throughput mode: idempotent producer, batched sends, delivery
+# reports served by a background poll thread, flush only at shutdown.
+# KAFKA_HIGH_THROUGHPUT=0 restores the old produce + flush(5) per publish.
+KAFKA_HIGH_THROUGHPUT = os.getenv("KAFKA_HIGH_THROUGHPUT", "1") == "1"
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "sentinel.attacks")
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "20"))
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", "262144"))  # bytes per partition batch
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "lz4")
+KAFKA_POLL_INTERVAL = float(os.getenv("KAFKA_POLL_INTERVAL", "0.1"))  # seconds
+KAFKA_FLUSH_TIMEOUT = float(os.getenv("KAFKA_FLUSH_TIMEOUT", "10"))  # seconds, at shutdown
+KAFKA_DEBUG = os.getenv("KAFKA_DEBUG", "")  # e.g. "broker,security"
+
 producer = None
 _init_lock = threading.Lock()
 _init_failed = False
+_closed = False  # set by shutdown_producer: late publishes must not start a new producer
+_poll_thread = None
+_stop_polling = threading.Event()
+_stats = {"produced": 0, "delivered": 0, "failed": 0, "buffer_full": 0}
+
+def _config():
+    conf = {
+        "bootstrap.servers": os.getenv("KAFKA_BOOTSTRAP", ""),
+        "security.protocol": "SASL_SSL",
+        "sasl.mechanisms": "PLAIN",
+        "sasl.username": os.getenv("KAFKA_API_KEY", ""),
+        "sasl.password": os.getenv("KAFKA_API_SECRET", ""),
+        "client.id": "sentinelai-producer",
+        "socket.timeout.ms": 5000,
+    }
+    if KAFKA_DEBUG:
+        conf["debug"] = KAFKA_DEBUG
+    if KAFKA_HIGH_THROUGHPUT:
+        conf.update({
+            "enable.idempotence": True,  # implies acks=all; no duplicates or reordering on retry
+            "linger.ms": KAFKA_LINGER_MS,
+            "batch.size": KAFKA_BATCH_SIZE,
+            "compression.type": KAFKA_COMPRESSION,
+        })
+    return conf
+
+def _poll_loop(producer_instance):
+    """Serve delivery reports in the background so publishers never wait on the broker"""
+    while not _stop_polling.is_set():
+        try:
+            producer_instance.poll(KAFKA_POLL_INTERVAL)
+        except Exception as e:
+            print(f"⚠️  Kafka poll error: {e}")
 
 def _get_producer():
-    global producer, _init_failed
-    
-    if _init_failed:
+    global producer, _init_failed, _poll_thread
+
+    if _init_failed or _closed:
         return None
-    
+
     if producer is not None:
         return producer
-    
+
     with _init_lock:
         if producer is not None:
             return producer
-        
+
         try:
-            conf = {
-                "bootstrap.servers": os.getenv("KAFKA_BOOTSTRAP", ""),
-                "security.protocol": "SASL_SSL",
-                "sasl.mechanisms": "PLAIN",
-                "sasl.username": os.getenv("KAFKA_API_KEY", ""),
-                "sasl.password": os.getenv("KAFKA_API_SECRET", ""),
-                "client.id": "sentinelai-producer",
-                "socket.timeout.ms": 5000,
-                "debug": "broker,security"
-            }
-            
+            conf = _config()
+
             # Skip Kafka if no credentials
             if not conf["bootstrap.servers"] or not conf["sasl.username"]:
                 print("⚠️  Kafka not configured, skipping")
                 _init_failed = True
                 return None
-            
+
             producer = Producer(conf)
-            print("✅ Kafka producer initialized")
+            if KAFKA_HIGH_THROUGHPUT:
+                _stop_polling.clear()
+                _poll_thread = threading.Thread(target=_poll_loop, args=(producer,), name="kafka-poll", daemon=True)
+                _poll_thread.start()
+            print(f"✅ Kafka producer initialized ({'high-throughput' if KAFKA_HIGH_THROUGHPUT else 'per-event flush'})")
             return producer
         except Exception as e:
             print(f"⚠️  Kafka initialization failed (non-blocking): {e}")
@@ -49,24 +89,71 @@ def _get_producer():
 
 def delivery_report(err, msg):
     if err:
+        _stats["failed"] += 1
         print("❌ Kafka delivery failed:", err)
     else:
-        print("✅ Kafka delivered:", msg.topic(), msg.offset())
+        _stats["delivered"] += 1
 
-def publish_attack(event: dict):
+def _produce(producer_instance, event: dict) -> bool:
+    """Queue one event; False (counted as failed) if it could not be queued"""
+    try:
+        value = json.dumps(event)
+        try:
+            producer_instance.produce(topic=KAFKA_TOPIC, value=value, callback=delivery_report)
+        except BufferError:
+            # Local queue full: wait for deliveries to make room, then retry once
+            _stats["buffer_full"] += 1
+            producer_instance.poll(1)
+            producer_instance.produce(topic=KAFKA_TOPIC, value=value, callback=delivery_report)
+    except Exception:
+        _stats["failed"] += 1
+        return False
+    _stats["produced"] += 1
+    return True
+
+def publish_attacks(events):
+    """Produce a batch of events; in high-throughput mode this returns without waiting for the broker"""
     try:
         producer_instance = _get_producer()
         if producer_instance is None:
-            print("⚠️  Kafka unavailable, skipping publish")
+            print("⚠️  Kafka producer shut down, skipping publish" if _closed else "⚠️  Kafka unavailable, skipping publish")
             return
-        
-        print("📤 Sending to Kafka:", event)
-        producer_instance.produce(
-            topic="sentinel.attacks",
-            value=json.dumps(event),
-            callback=delivery_report
-        )
-        producer_instance.flush(5)
+
+        # One event that cannot be queued does not cost the rest of the batch
+        dropped = sum(not _produce(producer_instance, event) for event in events)
+        if dropped:
+            print(f"⚠️  Kafka: {dropped} of {len(events)} event(s) not queued (local queue full or unserializable)")
+        if not KAFKA_HIGH_THROUGHPUT:
+            producer_instance.flush(5)
     except Exception as e:
         print(f"⚠️  Publish error: {e}")
 
+def publish_attack(event: dict):
+    publish_attacks([event])
+
+def shutdown_producer(timeout: float = KAFKA_FLUSH_TIMEOUT):
+    """Stop the poll thread and deliver everything still queued; later publishes are skipped"""
+    global _poll_thread, _closed
+    _closed = True
+    if producer is None:
+        return
+    _stop_polling.set()
+    if _poll_thread is not None:
+        _poll_thread.join(KAFKA_POLL_INTERVAL * 2 + 1)
+        _poll_thread = None
+    remaining = producer.flush(timeout)
+    if remaining:
+        print(f"⚠️  Kafka shutdown: {remaining} event(s) not delivered within {timeout}s")
+    else:
+        print("✅ Kafka producer flushed")
+
+def producer_stats():
+    return {
+        "mode": "high-throughput" if KAFKA_HIGH_THROUGHPUT else "per-event flush",
+        "available": producer is not None,
+        "linger_ms": KAFKA_LINGER_MS if KAFKA_HIGH_THROUGHPUT else None,
+        "batch_size": KAFKA_BATCH_SIZE if KAFKA_HIGH_THROUGHPUT else None,
+        "compression": KAFKA_COMPRESSION if KAFKA_HIGH_THROUGHPUT else None,
+        "queued": len(producer) if producer is not None else 0,
+        **_stats,
+    }
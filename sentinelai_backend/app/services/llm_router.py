@@ -1,29 +1,56 @@
 import os
+import json
 import requests
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1/chat/completions")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
-def send_to_llm(prompt: str):
-
-    if not OPENAI_API_KEY:
-        return {"error": "LLM API key missing"}
-
+def _request(prompt: str, stream: bool = False):
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
     }
 
     payload = {
-        "model": "gpt-4o-mini",
+        "model": LLM_MODEL,
         "messages": [
             {"role": "user", "content": prompt}
         ]
     }
+    if stream:
+        payload["stream"] = True
 
-    r = requests.post(
-        "https://api.openai.com/v1/chat/completions",
+    return requests.post(
+        LLM_API_URL,
         json=payload,
-        headers=headers
+        headers=headers,
+        stream=stream
     )
 
+def send_to_llm(prompt: str):
+
+    if not OPENAI_API_KEY:
+        return {"error": "LLM API key missing"}
+
+    r = _request(prompt)
+
     return r.json()
+
+def stream_llm(prompt: str):
+    """Yield the completion text chunk by chunk (OpenAI server-sent events)"""
+    r = _request(prompt, stream=True)
+    try:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                yield content
+    finally:
+        r.close()
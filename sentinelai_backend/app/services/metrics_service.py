@@ -1,22 +1,139 @@
-from app.db.mongo import attack_logs
+"""
+Attack metrics served from an incrementally maintained rollup.
+
+Every audit batch that lands in attack_logs also applies one $inc to a
+single document in metrics_rollups: event count, counts per decision and
+per triggering brain, and the running sum / count of risk scores. The
+dashboard summary is one find_one on that document, O(1) however long
+the history is, and the average risk is sum / count of the `risk` field
+/scan actually writes. Events whose risk is only a cascade lower bound
+(`risk_lower_bound`) count towards the totals and decisions but not the
+risk average or the per-brain counts.
+
+The rollup can be rebuilt from the logs with
+
+    python -m app.services.metrics_service --backfill
+
+which streams attack_logs through the same fold used at write time and
+replaces the rollup. Run it while the API is stopped (or idle): events
+logged during the backfill are otherwise counted twice or not at all.
+"""
+import argparse
+import time
+
+from app.db.mongo import attack_logs, metrics_rollups
+
+ROLLUP_ID = "summary"
+BACKFILL_BATCH = 10000
+
+# Only these fields are read back from attack_logs by the backfill
+_FIELDS = {"decision": 1, "risk": 1, "risk_lower_bound": 1, "triggered_by": 1, "timestamp": 1}
+
+
+def _key(name) -> str:
+    """Make a decision / brain name safe as a MongoDB field name"""
+    return str(name).replace(".", "_").lstrip("$") or "unknown"
 
-def get_attack_metrics():
-    total = attack_logs.count_documents({})
-    blocks = attack_logs.count_documents({"decision": "block"})
-    sanitizes = attack_logs.count_documents({"decision": "sanitize"})
 
-    pipeline = [
-        {"$group": {"_id": None, "avgRisk": {"$avg": "$confidence"}}}
-    ]
+def rollup_increments(events) -> dict:
+    """Fold events into one $inc / $min / $max update (empty dict for no events)"""
+    inc, first, last = {}, None, None
+    for event in events:
+        decision = event.get("decision")
+        if isinstance(decision, dict):  # /security logs the whole policy result
+            decision = decision.get("decision")
+        inc["total"] = inc.get("total", 0) + 1
+        field = f"decisions.{_key(decision or 'unknown')}"
+        inc[field] = inc.get(field, 0) + 1
+        if event.get("risk_lower_bound"):
+            # Cascade skipped tiers: the decision counts, the scores stay out of risk and brains
+            inc["lower_bound"] = inc.get("lower_bound", 0) + 1
+        else:
+            for brain in event.get("triggered_by") or []:
+                if brain != "none":
+                    field = f"brains.{_key(brain)}"
+                    inc[field] = inc.get(field, 0) + 1
+            risk = event.get("risk")
+            if isinstance(risk, (int, float)) and not isinstance(risk, bool):
+                inc["risk_sum"] = inc.get("risk_sum", 0.0) + float(risk)
+                inc["risk_count"] = inc.get("risk_count", 0) + 1
+        ts = event.get("timestamp")
+        if isinstance(ts, (int, float)):
+            first = ts if first is None else min(first, ts)
+            last = ts if last is None else max(last, ts)
+    if not inc:
+        return {}
+    update = {"$inc": inc, "$set": {"updated_at": int(time.time())}}
+    if first is not None:
+        update["$min"] = {"first_event_at": first}
+        update["$max"] = {"last_event_at": last}
+    return update
 
-    avg = list(attack_logs.aggregate(pipeline))
-    avg_risk = round(avg[0]["avgRisk"], 2) if avg else 0
+
+def record_events(events):
+    """Apply a batch of newly logged events to the rollup (one upsert per batch)"""
+    update = rollup_increments(events)
+    if update:
+        metrics_rollups.update_one({"_id": ROLLUP_ID}, update, upsert=True)
+
+
+def get_attack_metrics():
+    rollup = metrics_rollups.find_one({"_id": ROLLUP_ID}) or {}
+    decisions = rollup.get("decisions", {})
+    risk_count = rollup.get("risk_count", 0)
 
     return {
-        "total_attacks": total,
-        "avg_risk": avg_risk,
+        "total_attacks": rollup.get("total", 0),
+        "avg_risk": round(rollup.get("risk_sum", 0.0) / risk_count, 2) if risk_count else 0,
         "by_decision": {
-            "block": blocks,
-            "sanitize": sanitizes
-        }
+            "block": decisions.get("block", 0),
+            "sanitize": decisions.get("sanitize", 0),
+            **decisions,
+        },
+        "by_brain": rollup.get("brains", {}),
+        "lower_bound_events": rollup.get("lower_bound", 0),
+        "first_event_at": rollup.get("first_event_at"),
+        "last_event_at": rollup.get("last_event_at"),
+        "updated_at": rollup.get("updated_at"),
     }
+
+
+def _merge(rollup: dict, update: dict):
+    """Apply a rollup_increments() update to an in-memory rollup document"""
+    for field, value in update.get("$inc", {}).items():
+        parent, _, name = field.rpartition(".")
+        target = rollup.setdefault(parent, {}) if parent else rollup
+        target[name] = target.get(name, 0) + value
+    for field, value in update.get("$min", {}).items():
+        rollup[field] = value if rollup.get(field) is None else min(rollup[field], value)
+    for field, value in update.get("$max", {}).items():
+        rollup[field] = value if rollup.get(field) is None else max(rollup[field], value)
+
+
+def backfill(batch_size: int = BACKFILL_BATCH) -> dict:
+    """Rebuild the rollup from every document in attack_logs"""
+    start = time.perf_counter()
+    rollup, batch, scanned = {"_id": ROLLUP_ID}, [], 0
+    for doc in attack_logs.find({}, _FIELDS).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            _merge(rollup, rollup_increments(batch))
+            scanned += len(batch)
+            batch = []
+            print(f"[BACKFILL] {scanned} events folded")
+    _merge(rollup, rollup_increments(batch))
+    scanned += len(batch)
+    rollup["updated_at"] = int(time.time())
+    metrics_rollups.replace_one({"_id": ROLLUP_ID}, rollup, upsert=True)
+    print(f"[OK] Metrics rollup rebuilt from {scanned} events in {time.perf_counter() - start:.1f}s")
+    return rollup
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SentinelAI attack metrics rollup")
+    parser.add_argument("--backfill", action="store_true", help="rebuild the rollup from attack_logs")
+    args = parser.parse_args()
+    if args.backfill:
+        backfill()
+    else:
+        print(get_attack_metrics())
@@ -0,0 +1,121 @@
+"""
+Dynamic micro-batching for concurrent scan requests.
+
+Requests that arrive within a short window (SCAN_BATCH_WINDOW_MS) are
+collected and run as one batched inference, up to SCAN_BATCH_SIZE at a
+time; a full batch is flushed immediately. Each caller awaits its own
+future, so the routes keep their one-request/one-result shape while
+encode and predict_proba see whole batches. Batches run on the detection
+pool, so admission control still applies.
+"""
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from typing import Callable
+
+from app.services.detection_pool import run_detection
+
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "1") == "1"
+SCAN_BATCH_WINDOW_MS = float(os.getenv("SCAN_BATCH_WINDOW_MS", "2"))
+SCAN_BATCH_SIZE = int(os.getenv("SCAN_BATCH_SIZE", "32"))
+
+# Histogram bucket upper bounds
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket = above the largest bound
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "count": self.total,
+            "avg": round(self.sum / self.total, 3) if self.total else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MicroBatcher:
+    def __init__(self, run_batch: Callable[[list], list], window_ms: float = SCAN_BATCH_WINDOW_MS,
+                 max_batch: int = SCAN_BATCH_SIZE):
+        self.run_batch = run_batch  # sync: list of items -> list of results (runs on the pool)
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+
+    async def submit(self, item):
+        """Queue one item and wait for its result from the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # submit() flushes as soon as max_batch is reached, so this is at most one batch
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        now = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.wait_ms.observe((now - enqueued) * 1000)
+
+        try:
+            results = await run_detection(self.run_batch, [item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():  # caller may have gone away
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": MICRO_BATCHING,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "pending": len(self._pending),
+            "batch_size": self.batch_sizes.to_dict(),
+            "wait_ms": self.wait_ms.to_dict(),
+        }
+
+
+_batchers = {}
+
+
+def register_batcher(name: str, batcher: MicroBatcher) -> MicroBatcher:
+    _batchers[name] = batcher
+    return batcher
+
+
+def batcher_stats() -> dict:
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
@@ -1,39 +1,163 @@
+"""
+Shared non-blocking Redis client.
+
+One `redis.asyncio` client per process, backed by a bounded connection
+pool (REDIS_MAX_CONNECTIONS) and used by every route, the verdict cache
+and the session store. Each call is wrapped in a REDIS_TIMEOUT deadline,
+so a slow or unreachable Redis costs a request at most that long instead
+of stalling the event loop. After a failure Redis is skipped for
+REDIS_RETRY_AFTER seconds and callers get their default (a cache miss).
+`pipeline()` sends a batch of commands in one round trip and
+`check_and_set()` is an optimistic compare-and-set (WATCH/MULTI).
+
+The pool connects lazily on first use inside the running event loop, so
+it is safe to import before fork (serve_prefork) or in tests.
+"""
+import asyncio
 import os
-import redis
-import json
-
-try:
-    redis_host = os.getenv("REDIS_HOST", "localhost")
-    redis_port = int(os.getenv("REDIS_PORT", "6379"))
-    redis_password = os.getenv("REDIS_PASSWORD")
-    r = redis.Redis(
-        host=redis_host,
-        port=redis_port,
-        password=redis_password,
-        decode_responses=True,
-        socket_connect_timeout=2,
-        socket_keepalive=True,
-        health_check_interval=30
-    )
-    r.ping()  # Test connection
-    print("[OK] Redis cache available")
-except Exception as e:
-    print(f"[WARN] Redis connection failed: {e}")
-    r = None
-
-def get_cached_policy(text: str):
-    if r is None:
-        return None
-    try:
-        return r.get(text)
-    except Exception as e:
-        print(f"Redis GET error: {e}")
-        return None
-
-def set_cached_policy(text: str, result: dict):
-    if r is None:
-        return
-    try:
-        r.set(text, json.dumps(result), ex=60)  # 60 sec TTL
-    except Exception as e:
-        print(f"Redis SET error: {e}")
+import time
+
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.25"))  # seconds per call
+REDIS_RETRY_AFTER = float(os.getenv("REDIS_RETRY_AFTER", "5"))
+
+
+class AsyncRedis:
+    def __init__(self, client=None, timeout: float = REDIS_TIMEOUT, retry_after: float = REDIS_RETRY_AFTER):
+        if client is None:
+            pool = aioredis.ConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                password=REDIS_PASSWORD,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=timeout,
+                socket_timeout=timeout,
+                socket_keepalive=True,
+                health_check_interval=30,
+            )
+            client = aioredis.Redis(connection_pool=pool)  # binary replies: values are compressed
+        self.client = client
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.skipped = 0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    async def _run(self, name: str, make_call, default=None):
+        if not self.available:
+            self.skipped += 1
+            return default
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(make_call(), self.timeout)
+        except Exception as e:
+            self.errors += 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+            if self.available:
+                print(f"[WARN] Redis {name} failed ({type(e).__name__}: {e}); skipping Redis for {self.retry_after}s")
+            self._down_until = time.monotonic() + self.retry_after
+            return default
+
+    async def ping(self) -> bool:
+        return bool(await self._run("PING", self.client.ping, False))
+
+    async def get(self, key: str):
+        return await self._run("GET", lambda: self.client.get(key))
+
+    async def mget(self, keys):
+        """Values for `keys` in one round trip, or None if Redis failed"""
+        return await self._run("MGET", lambda: self.client.mget(keys))
+
+    async def set(self, key: str, value, ex: int = None) -> bool:
+        return bool(await self._run("SET", lambda: self.client.set(key, value, ex=ex), False))
+
+    async def delete(self, key: str) -> int:
+        return await self._run("DEL", lambda: self.client.delete(key), 0)
+
+    async def pipeline(self, build):
+        """Run the commands `build(pipe)` queues in one round trip; their replies, or None on failure"""
+        async def run():
+            async with self.client.pipeline(transaction=False) as pipe:
+                build(pipe)
+                return await pipe.execute()
+        return await self._run("pipeline", run)
+
+    async def check_and_set(self, key: str, check, value, ex: int = None):
+        """
+        SET key to value only if check(current value) is true, atomically
+        (WATCH/MULTI). True if written, False if the check failed or the key
+        changed underneath, None if Redis failed.
+        """
+        async def run():
+            async with self.client.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                if not check(await pipe.get(key)):
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, value, ex=ex)
+                try:
+                    await pipe.execute()
+                except WatchError:
+                    return False
+                return True
+        return await self._run("WATCH/SET", run)
+
+    async def close(self):
+        """Drop pooled connections (they reconnect lazily, e.g. in a new event loop)"""
+        try:
+            await self.client.connection_pool.disconnect()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "host": f"{REDIS_HOST}:{REDIS_PORT}",
+            "available": self.available,
+            "timeout_s": self.timeout,
+            "max_connections": REDIS_MAX_CONNECTIONS,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+        }
+
+
+_client = None
+
+
+def get_redis() -> AsyncRedis:
+    """The process-wide client (created on first use)"""
+    global _client
+    if _client is None:
+        _client = AsyncRedis()
+    return _client
+
+
+async def close_redis():
+    if _client is not None:
+        await _client.close()
+
+
+async def get_cached_policy(text: str):
+    """Cached verdict for `text` (see app.services.verdict_cache), or None"""
+    from app.services.verdict_cache import get_verdict_cache
+    return await get_verdict_cache().get(text)
+
+
+async def set_cached_policy(text: str, result: dict):
+    from app.services.verdict_cache import get_verdict_cache
+    await get_verdict_cache().set(text, result)
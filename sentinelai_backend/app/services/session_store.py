@@ -0,0 +1,151 @@
+"""
+Bounded store for conversation scan state (app.core.conversation).
+
+Sessions live in an in-process LRU capped at SESSION_MAX_SESSIONS entries
+and expire after SESSION_TTL seconds without a turn. With SESSION_REDIS=1
+Redis is the source of truth, so any worker can continue a conversation:
+every read goes to Redis (the LRU is only a fallback while Redis is
+unreachable), and every state carries a version that `save` bumps with a
+compare-and-set (WATCH/MULTI). A save based on a stale copy returns
+False and the caller re-reads and re-applies its turn, so concurrent
+workers never overwrite each other's turns. If Redis is not reachable
+the store silently stays in-memory only. `lock(conversation_id)`
+serializes the turns of one conversation within a worker.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.conversation import new_state
+
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_REDIS = os.getenv("SESSION_REDIS", "0") == "1"
+SESSION_KEY_PREFIX = "sentinel:session:"
+SESSION_LOCK_STRIPES = 64
+SESSION_SAVE_RETRIES = int(os.getenv("SESSION_SAVE_RETRIES", "5"))
+
+
+def _redis_client():
+    if not SESSION_REDIS:
+        return None
+    from app.services.redis_cache import get_redis
+    return get_redis()
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, ttl: int = SESSION_TTL, redis_client=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.redis = redis_client
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._turn_locks = [asyncio.Lock() for _ in range(SESSION_LOCK_STRIPES)]
+        self.evicted = 0
+        self.expired = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.conflicts = 0
+
+    def _expired(self, state: dict) -> bool:
+        return self.ttl > 0 and time.time() - state["updated_at"] > self.ttl
+
+    def lock(self, conversation_id: str) -> asyncio.Lock:
+        return self._turn_locks[hash(conversation_id) % SESSION_LOCK_STRIPES]
+
+    async def get(self, conversation_id: str) -> Optional[dict]:
+        """The session state, or None if unknown or expired"""
+        if self.redis is not None:
+            raw = await self.redis.get(SESSION_KEY_PREFIX + conversation_id)
+            if raw:
+                self.redis_hits += 1
+                state = json.loads(raw)
+                self._put_local(conversation_id, state)
+                return state
+            if self.redis.available:  # a real miss: expired or deleted by another worker
+                with self._lock:
+                    self._sessions.pop(conversation_id, None)
+                return None
+            # Redis unreachable: serve the local copy
+        with self._lock:
+            state = self._sessions.get(conversation_id)
+            if state is None:
+                return None
+            if self._expired(state):
+                del self._sessions[conversation_id]
+                self.expired += 1
+                return None
+            self._sessions.move_to_end(conversation_id)
+            return state
+
+    async def get_or_create(self, conversation_id: str) -> dict:
+        return await self.get(conversation_id) or new_state(conversation_id)
+
+    def _put_local(self, conversation_id: str, state: dict):
+        with self._lock:
+            self._sessions[conversation_id] = state
+            self._sessions.move_to_end(conversation_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+
+    async def save(self, state: dict) -> bool:
+        """
+        Store `state` (as read by get/get_or_create, then updated). False if
+        another worker saved this conversation in between: re-read and retry.
+        """
+        conversation_id = state["conversation_id"]
+        expected = state.get("version", 0)
+        state["version"] = expected + 1
+        if self.redis is not None:
+            def unchanged(raw):
+                return (json.loads(raw).get("version", 0) if raw else 0) == expected
+
+            written = await self.redis.check_and_set(SESSION_KEY_PREFIX + conversation_id, unchanged,
+                                                     json.dumps(state), ex=self.ttl or None)
+            if written is False:
+                state["version"] = expected
+                self.conflicts += 1
+                return False
+            if written is None:
+                self.redis_errors += 1
+        self._put_local(conversation_id, state)
+        return True
+
+    async def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(conversation_id, None) is not None
+        if self.redis is not None:
+            found = bool(await self.redis.delete(SESSION_KEY_PREFIX + conversation_id)) or found
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_s": self.ttl,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "redis": self.redis is not None,
+                "redis_hits": self.redis_hits,
+                "redis_errors": self.redis_errors,
+                "conflicts": self.conflicts,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(redis_client=_redis_client())
+    return _store
@@ -0,0 +1,77 @@
+"""
+Single-flight coalescing of identical in-flight scans.
+
+Retry storms and fan-out clients send the same prompt many times within
+a few milliseconds; every copy misses the verdict cache because the
+first result has not been written yet. `SingleFlight.do(key, make_call)`
+runs `make_call()` once per key at a time: the first caller (the leader)
+starts it, every caller that arrives with the same key while it is still
+running (a follower) awaits the same task, and all receive its result
+(or exception). Followers get the same object, so they must copy before
+changing it.
+
+The computation runs as its own task and callers await it through
+`asyncio.shield`, so a leader whose client disconnects does not cancel
+the scan the followers are waiting for.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Tuple
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") == "1"
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_followers = 0
+        self._followers: Dict[str, int] = {}
+
+    def _done(self, key: str, task: asyncio.Future):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            self.max_followers = max(self.max_followers, self._followers.pop(key, 0))
+        if not task.cancelled():
+            task.exception()  # mark retrieved: followers may all have gone away
+
+    async def do(self, key: str, make_call: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """(result of `make_call()`, whether it was shared from another caller's flight)"""
+        self.calls += 1
+        task = self._flights.get(key)
+        shared = task is not None
+        if not shared:
+            self.leaders += 1
+            task = asyncio.ensure_future(make_call())
+            self._flights[key] = task
+            self._followers[key] = 0
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.coalesced += 1
+            self._followers[key] += 1
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SINGLE_FLIGHT,
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "max_followers": self.max_followers,
+        }
+
+
+_flights = {}
+
+
+def register_flight(name: str, flight: SingleFlight) -> SingleFlight:
+    _flights[name] = flight
+    return flight
+
+
+def single_flight_stats() -> dict:
+    return {name: flight.stats() for name, flight in _flights.items()}
@@ -0,0 +1,255 @@
+"""
+Layered verdict cache: in-process LRU (L1) in front of Redis (L2).
+
+Keys are `sentinel:verdict:<version>:<sha256>`:
+- the digest is of the lowercased text, which is all any brain looks at,
+  so a megabyte prompt still makes a 100-byte key
+- the version hashes everything a verdict depends on besides the text:
+  model artifacts (file name, size, mtime), embedding model, feature
+  mode, decision thresholds, policy table, registered rule patterns and
+  the attack exemplar fingerprint. A retrain, policy change or exemplar
+  reload therefore starts a fresh key space instead of serving stale
+  verdicts; old entries simply age out.
+
+Values are zlib-compressed JSON in both layers. TTLs depend on the
+decision (VERDICT_TTL_ALLOW / _SANITIZE / _BLOCK). An L2 miss is
+remembered in L1 for VERDICT_NEGATIVE_TTL seconds (negative caching) so
+a burst of new prompts does not hit Redis once per request. `get_many`
+serves multi-text scans with one MGET for everything L1 does not have,
+and `set_many` writes back in one pipeline. Redis calls go through the
+shared non-blocking client (app.services.redis_cache); when Redis is down
+or slow the cache degrades to L1 only.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+VERDICT_CACHE = os.getenv("VERDICT_CACHE", "1") == "1"
+VERDICT_L1_SIZE = int(os.getenv("VERDICT_L1_SIZE", "10000"))
+VERDICT_L1_TTL = int(os.getenv("VERDICT_L1_TTL", "60"))
+VERDICT_TTL_ALLOW = int(os.getenv("VERDICT_TTL_ALLOW", "3600"))
+VERDICT_TTL_SANITIZE = int(os.getenv("VERDICT_TTL_SANITIZE", "600"))
+VERDICT_TTL_BLOCK = int(os.getenv("VERDICT_TTL_BLOCK", "86400"))
+VERDICT_NEGATIVE_TTL = float(os.getenv("VERDICT_NEGATIVE_TTL", "5"))
+VERDICT_COMPRESS_LEVEL = int(os.getenv("VERDICT_COMPRESS_LEVEL", "1"))
+# Bump by hand to drop every cached verdict (e.g. after a rules change in code)
+VERDICT_CACHE_VERSION = os.getenv("VERDICT_CACHE_VERSION", "1")
+
+KEY_PREFIX = "sentinel:verdict:"
+
+_TTLS = {"allow": VERDICT_TTL_ALLOW, "sanitize": VERDICT_TTL_SANITIZE, "block": VERDICT_TTL_BLOCK}
+_MISS = b""  # L1 marker for "not in L2 either"
+
+ML_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ml"))
+
+
+def _artifact_signature() -> List[str]:
+    files = []
+    for pattern in ("*.pkl", "*.npy", "*.json"):
+        for path in sorted(glob.glob(os.path.join(ML_DIR, pattern))):
+            st = os.stat(path)
+            files.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return files
+
+
+def _static_version() -> str:
+    """Hash of the model / policy / rules configuration (not the exemplars)"""
+    from app.core import detector, hashed_model, policy_engine
+    from app.core.ethics_guardian import UNETHICAL_PATTERNS
+    from app.core.pattern_matcher import get_matcher
+
+    matcher = get_matcher()
+    patterns = {tag: matcher.patterns(tag) for tag in sorted(matcher.tags())}
+    parts = {
+        "manual": VERDICT_CACHE_VERSION,
+        "artifacts": _artifact_signature(),
+        "embedding_model": detector.EMBEDDING_MODEL,
+        "feature_mode": hashed_model.FEATURE_MODE,
+        "thresholds": [detector.SANITIZE_THRESHOLD, detector.BLOCK_THRESHOLD],
+        "policies": policy_engine.POLICIES,
+        "patterns": patterns,
+        "ethics_patterns": UNETHICAL_PATTERNS,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    def __init__(self, redis_client=None, l1_size: int = VERDICT_L1_SIZE, l1_ttl: float = VERDICT_L1_TTL,
+                 negative_ttl: float = VERDICT_NEGATIVE_TTL):
+        self.redis = redis_client
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.negative_ttl = negative_ttl
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, compressed or _MISS)
+        self._lock = threading.Lock()
+        self._static = None  # (matcher version, static version hash)
+        self.l1_hits = 0
+        self.negative_hits = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.sets = 0
+        self.errors = 0
+
+    # ---- keys -------------------------------------------------------------
+
+    def version(self) -> str:
+        from app.core.exemplar_index import get_exemplar_index
+        from app.core.pattern_matcher import get_matcher
+
+        matcher_version = get_matcher().version
+        if self._static is None or self._static[0] != matcher_version:
+            self._static = (matcher_version, _static_version())
+        fingerprint = get_exemplar_index().stats()["fingerprint"] or ""
+        return hashlib.sha256(f"{self._static[1]}:{fingerprint}".encode("utf-8")).hexdigest()[:16]
+
+    def key(self, text: str, mode: str = "", version: str = None) -> str:
+        digest = hashlib.sha256(f"{mode}\0{text.lower()}".encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}{version or self.version()}:{digest}"
+
+    # ---- encoding ---------------------------------------------------------
+
+    @staticmethod
+    def _encode(value: dict) -> bytes:
+        return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), VERDICT_COMPRESS_LEVEL)
+
+    @staticmethod
+    def _decode(blob: bytes) -> dict:
+        return json.loads(zlib.decompress(blob))
+
+    # ---- L1 ---------------------------------------------------------------
+
+    def _l1_get(self, key: str):
+        """Compressed value, _MISS (known absent), or None (unknown)"""
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    def _l1_put(self, key: str, blob: bytes, ttl: float):
+        if self.l1_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, blob)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    # ---- public API -------------------------------------------------------
+
+    async def get(self, text: str, mode: str = "") -> Optional[dict]:
+        return (await self.get_many([text], mode))[0]
+
+    async def get_many(self, texts: List[str], mode: str = "") -> List[Optional[dict]]:
+        """Verdicts for `texts` (None where uncached): L1 first, then one MGET for the rest"""
+        if not VERDICT_CACHE:
+            return [None] * len(texts)
+        version = self.version()
+        keys = [self.key(t, mode, version) for t in texts]
+        results: List[Optional[dict]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            blob = self._l1_get(key)
+            if blob is None:
+                missing.setdefault(key, []).append(i)
+            elif blob == _MISS:
+                self.negative_hits += 1
+            else:
+                self.l1_hits += 1
+                results[i] = self._decode(blob)
+
+        if missing and self.redis is not None:
+            lookup = list(missing)
+            blobs = await self.redis.mget(lookup)
+            if blobs is None:  # Redis failed or timed out: plain misses, nothing negative-cached
+                self.errors += 1
+                return results
+            for key, blob in zip(lookup, blobs):
+                if blob:
+                    self.l2_hits += len(missing[key])
+                    self._l1_put(key, blob, self.l1_ttl)
+                    for i in missing[key]:
+                        results[i] = self._decode(blob)
+                else:
+                    self.l2_misses += len(missing[key])
+                    self._l1_put(key, _MISS, self.negative_ttl)
+        elif missing:
+            self.l2_misses += sum(len(v) for v in missing.values())
+        return results
+
+    async def set(self, text: str, verdict: dict, decision: str = None, mode: str = ""):
+        await self.set_many([(text, verdict, decision)], mode)
+
+    async def set_many(self, items, mode: str = ""):
+        """Cache (text, verdict, decision) triples; one pipelined round trip to Redis"""
+        if not VERDICT_CACHE or not items:
+            return
+        version = self.version()
+        writes = []
+        for text, verdict, decision in items:
+            decision = decision or verdict.get("hybrid_analysis", verdict).get("decision")
+            ttl = _TTLS.get(decision, VERDICT_TTL_SANITIZE)
+            key = self.key(text, mode, version)
+            blob = self._encode(verdict)
+            self._l1_put(key, blob, min(self.l1_ttl, ttl))
+            writes.append((key, blob, ttl))
+            self.sets += 1
+        if self.redis is not None:
+            def queue(pipe):
+                for key, blob, ttl in writes:
+                    pipe.set(key, blob, ex=ttl)
+            if await self.redis.pipeline(queue) is None:
+                self.errors += 1
+
+    def clear_local(self):
+        with self._lock:
+            self._l1.clear()
+
+    def stats(self) -> dict:
+        lookups = self.l1_hits + self.negative_hits + self.l2_hits + self.l2_misses
+        l2_lookups = self.l2_hits + self.l2_misses
+        with self._lock:
+            entries = len(self._l1)
+            l1_bytes = sum(len(blob) for _, blob in self._l1.values())
+        return {
+            "enabled": VERDICT_CACHE,
+            "version": self.version(),
+            "redis": self.redis.stats() if self.redis is not None else None,
+            "l1_entries": entries,
+            "l1_max_entries": self.l1_size,
+            "l1_bytes": l1_bytes,
+            "lookups": lookups,
+            "l1_hits": self.l1_hits,
+            "negative_hits": self.negative_hits,
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l1_hit_rate": round(self.l1_hits / lookups, 4) if lookups else 0.0,
+            "l2_hit_rate": round(self.l2_hits / l2_lookups, 4) if l2_lookups else 0.0,
+            "hit_rate": round((self.l1_hits + self.l2_hits) / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "errors": self.errors,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from app.services.redis_cache import get_redis
+                _cache = VerdictCache(redis_client=get_redis())
+    return _cache
@@ -1,7 +1,10 @@
 import time
 import json
+from pymongo.errors import BulkWriteError
 from app.db.mongo import attack_logs
-from app.services.kafka_producer import publish_attack
+from app.services.audit_writer import AuditWriter, register_audit_writer
+from app.services.kafka_producer import publish_attacks
+from app.services.metrics_service import record_events
 
 _subscribers = []
 
@@ -19,18 +22,41 @@ async def broadcast(event):
         except:
             pass
 
-async def log_incident(event: dict):
-    event["timestamp"] = int(time.time())
-
-    kafka_event = event.copy()
+def _write_batch(events):
+    """
+    One unordered insert_many plus one batched Kafka produce; runs on the audit writer's thread.
+    Returns the Kafka copies of the events and how many of them did not reach attack_logs.
+    """
+    kafka_events = [event.copy() for event in events]
+    failed = set()
     try:
-        result = attack_logs.insert_one(event)
-        kafka_event["_id"] = str(result.inserted_id)
+        attack_logs.insert_many(events, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"] for err in e.details.get("writeErrors", [])}
+        print(f"[WARN] MongoDB log failed for {len(failed)} of {len(events)} events")
     except Exception as e:
+        failed = set(range(len(events)))
         print(f"[WARN] MongoDB log failed: {e}")
-        kafka_event["_id"] = "unavailable"
 
-    publish_attack(kafka_event)
+    for i, (event, kafka_event) in enumerate(zip(events, kafka_events)):
+        kafka_event["_id"] = "unavailable" if i in failed or "_id" not in event else str(event["_id"])
+
+    # Keep the metrics rollup in step with what was actually logged
+    try:
+        record_events([event for i, event in enumerate(events) if i not in failed])
+    except Exception as e:
+        print(f"[WARN] Metrics rollup update failed: {e}")
+
+    publish_attacks(kafka_events)
+    return kafka_events, len(failed)
+
+async def _broadcast_batch(events):
+    for event in events:
+        await broadcast(event)
 
-    await broadcast(kafka_event)
+# MongoDB, Kafka and WebSocket delivery happen off the request path
+audit_writer = register_audit_writer(AuditWriter(_write_batch, _broadcast_batch))
 
+async def log_incident(event: dict):
+    event["timestamp"] = int(time.time())
+    await audit_writer.enqueue(event)
@@ -0,0 +1,68 @@
+"""
+Adversarial-length benchmark for the compiled regex engine.
+
+Compares the legacy per-pattern re.search/re.sub loops (unbounded `.*`)
+against the compiled bounded-window PatternSets used by ethics_guardian
+and prompt_sanitizer, on inputs built to trigger catastrophic backtracking.
+"""
+import re
+import time
+
+from app.core.ethics_guardian import UNETHICAL_PATTERNS, ethics_check
+from app.core.prompt_sanitizer import INJECTION_PATTERNS, sanitize_prompt
+
+# Worst-case latency budget for a 100 KB input with the compiled engine
+BUDGET_MS = 500
+
+
+def legacy_sanitize(text):
+    cleaned = text
+    for pattern in INJECTION_PATTERNS:
+        cleaned = re.sub(pattern, "[BLOCKED]", cleaned, flags=re.IGNORECASE)
+    return cleaned
+
+
+def legacy_ethics(text):
+    text_lower = text.lower()
+    return [name for regex, name in UNETHICAL_PATTERNS if re.search(regex, text_lower)]
+
+
+def adversarial_inputs(size):
+    return {
+        "ignore-flood": ("ignore " * (size // 7 + 1))[:size],
+        "pretend-flood": ("pretend " * (size // 8 + 1))[:size],
+        "send-spaces": "send " + " " * (size - 5),
+        "remove-flood": ("remove " * (size // 7 + 1))[:size],
+        "mixed": ("ignore the rules, pretend, send, execute, reveal " * (size // 50 + 1))[:size],
+    }
+
+
+def timed(fn, text):
+    start = time.perf_counter()
+    fn(text)
+    return (time.perf_counter() - start) * 1000
+
+
+print("=" * 80)
+print("REGEX ENGINE - ADVERSARIAL LENGTH BENCHMARK")
+print("=" * 80)
+
+# Legacy engine only on small inputs: it grows quadratically
+print("\n[Legacy] per-pattern loops with unbounded gaps")
+for size in (2_000, 5_000, 10_000):
+    for name, text in adversarial_inputs(size).items():
+        ms = timed(legacy_sanitize, text) + timed(legacy_ethics, text)
+        print(f"  {size // 1000:>4} KB  {name:<14} {ms:10.1f} ms")
+
+print("\n[Compiled] single bounded-window alternation")
+worst = 0.0
+for size in (2_000, 5_000, 10_000, 50_000, 100_000):
+    for name, text in adversarial_inputs(size).items():
+        ms = timed(sanitize_prompt, text) + timed(ethics_check, text)
+        worst = max(worst, ms) if size == 100_000 else worst
+        print(f"  {size // 1000:>4} KB  {name:<14} {ms:10.1f} ms")
+
+print("\n" + "=" * 80)
+status = "✅" if worst <= BUDGET_MS else "❌"
+print(f"{status} Worst-case 100 KB latency: {worst:.1f} ms (budget {BUDGET_MS} ms)")
+print("=" * 80)
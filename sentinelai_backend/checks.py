@@ -0,0 +1,50 @@
+"""
+Pass/fail bookkeeping shared by the script-style test_*.py files.
+
+    from checks import check, finish, skip
+
+    check(result == expected, "What was checked")
+    skip("What could not be checked here, and why")
+    ...
+    finish("long-text")
+
+check() prints one ✅ / ❌ line per check and skip() one ⚠️ line per
+check that could not run. finish() prints the summary footer and exits
+non-zero if any check failed, so a failing script fails the shell or CI
+step that runs it. A script where every check was skipped never reports
+a pass: it exits with NO_CHECKS_RAN (pytest's "no tests ran" code).
+"""
+import sys
+
+NO_CHECKS_RAN = 5
+
+failures = 0
+ran = 0
+skipped = 0
+
+
+def check(ok: bool, label: str) -> bool:
+    global failures, ran
+    ran += 1
+    print(f"{'✅' if ok else '❌'} {label}")
+    if not ok:
+        failures += 1
+    return ok
+
+
+def skip(label: str):
+    global skipped
+    skipped += 1
+    print(f"⚠️  Skipped: {label}")
+
+
+def finish(title: str):
+    print("\n" + "=" * 80)
+    if failures:
+        print(f"❌ {failures} check(s) failed")
+    elif not ran:
+        print(f"⚠️  No {title} checks ran ({skipped} skipped)")
+    else:
+        print(f"✅ All {title} checks passed" + (f" ({skipped} skipped)" if skipped else ""))
+    print("=" * 80)
+    sys.exit(1 if failures else NO_CHECKS_RAN if not ran else 0)
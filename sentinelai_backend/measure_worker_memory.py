@@ -0,0 +1,125 @@
+"""
+Per-worker memory of the two serving modes, read from /proc/<pid>/smaps_rollup.
+
+before: uvicorn --workers N  (every worker loads its own models)
+after:  serve_prefork.py     (models loaded once in the parent, shared copy-on-write)
+
+RSS counts every resident page a process maps, shared or not; PSS divides
+shared pages by the number of processes mapping them, so the PSS total is
+the real memory cost of the whole server.
+
+Usage:
+    python measure_worker_memory.py --workers 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+READY_TIMEOUT = 300
+
+
+def smaps_rollup(pid: int) -> dict:
+    """Memory fields of a process in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return fields
+
+
+def children(pid: int) -> list:
+    pids = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tid}/children") as f:
+            pids.extend(int(p) for p in f.read().split())
+    return pids
+
+
+def process_tree(pid: int) -> list:
+    tree = [pid]
+    for child in children(pid):
+        tree.extend(process_tree(child))
+    return tree
+
+
+def wait_ready(port: int, workers: int):
+    """Poll /ready until enough consecutive 200s that every worker has likely warmed up"""
+    deadline = time.time() + READY_TIMEOUT
+    streak = 0
+    while time.time() < deadline and streak < workers * 4:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=2) as r:
+                streak = streak + 1 if r.status == 200 else 0
+        except Exception:
+            streak = 0
+            time.sleep(0.5)
+    if streak < workers * 4:
+        raise RuntimeError(f"server on port {port} not ready after {READY_TIMEOUT}s")
+    time.sleep(2)
+
+
+def measure(name: str, cmd: list, port: int, workers: int) -> float:
+    print(f"\n[{name}] {' '.join(cmd)}")
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, workers)
+        total_rss = total_pss = 0.0
+        print(f"  {'pid':>8} {'role':<8} {'RSS MB':>10} {'PSS MB':>10} {'shared MB':>10}")
+        for pid in process_tree(proc.pid):
+            try:
+                mem = smaps_rollup(pid)
+            except OSError:
+                continue
+            shared = mem.get("Shared_Clean", 0) + mem.get("Shared_Dirty", 0)
+            role = "parent" if pid == proc.pid else "worker"
+            print(f"  {pid:>8} {role:<8} {mem.get('Rss', 0):>10.1f} {mem.get('Pss', 0):>10.1f} {shared:>10.1f}")
+            total_rss += mem.get("Rss", 0)
+            total_pss += mem.get("Pss", 0)
+        print(f"  {'total':>8} {'':<8} {total_rss:>10.1f} {total_pss:>10.1f}")
+        return total_pss
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def uvicorn_cmd(port: int, workers: int) -> list:
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers)]
+    # Newer uvicorn kills workers that miss a 5 s health check; model imports take longer
+    help_text = subprocess.run(cmd[:3] + ["--help"], capture_output=True, text=True).stdout
+    if "--timeout-worker-healthcheck" in help_text:
+        cmd += ["--timeout-worker-healthcheck", str(READY_TIMEOUT)]
+    return cmd
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"WORKER MEMORY - {args.workers} workers")
+    print("=" * 80)
+
+    before = measure("before", uvicorn_cmd(args.port, args.workers), args.port, args.workers)
+    after = measure("after", [sys.executable, "serve_prefork.py", "--host", "127.0.0.1",
+                              "--port", str(args.port + 1), "--workers", str(args.workers)],
+                    args.port + 1, args.workers)
+
+    print("\n" + "=" * 80)
+    status = "✅" if after < before else "❌"
+    saved = 1 - after / before if before else 0.0
+    print(f"{status} Total PSS: {before:.1f} MB -> {after:.1f} MB ({saved:.0%} less)")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Pre-fork server: load the detection brains once, share them across workers.
+
+The parent process loads every brain artifact (SentenceTransformer, the
+exemplar index, the injection/ethics/narrative models), runs the warm-up
+inferences and then calls gc.freeze() so the loaded objects are moved out
+of the garbage collector's generations and GC passes in the workers never
+write to their pages. It then binds the listening socket and forks the
+uvicorn workers, which share the model pages copy-on-write instead of each
+loading its own copy.
+
+The FastAPI app (database and cache clients) is imported in each worker
+after the fork, so no connection is shared between processes.
+
+Usage:
+    python serve_prefork.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "2"))
+# Intra-op threads per worker for torch; workers already run in parallel
+PREFORK_TORCH_THREADS = int(os.getenv("PREFORK_TORCH_THREADS", "1"))
+
+
+def load_brains():
+    """Load all brain artifacts in the parent and freeze them out of GC scanning"""
+    from app.core.warmup import warmup
+    try:
+        import torch
+        torch.set_num_threads(PREFORK_TORCH_THREADS)
+    except Exception:
+        pass
+
+    state = warmup()
+    gc.collect()
+    gc.freeze()
+    print(f"[OK] Brains loaded in parent {os.getpid()}, {gc.get_freeze_count()} objects frozen")
+    return state
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_worker(sock: socket.socket):
+    """Runs in a forked child: import the app and serve on the shared socket"""
+    import uvicorn
+    from app.main import app
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=os.getenv("LOG_LEVEL", "info"))
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            serve_worker(sock)
+        except Exception as e:
+            print(f"[WARN] Worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"[OK] Worker {pid} started")
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SentinelAI pre-fork server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS)
+    args = parser.parse_args()
+
+    load_brains()
+    sock = bind_socket(args.host, args.port)
+    print(f"[OK] Listening on {args.host}:{args.port} with {args.workers} workers")
+
+    workers = {spawn(sock) for _ in range(args.workers)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    # Reap workers; replace any that die unexpectedly
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"[WARN] Worker {pid} exited ({status}), restarting")
+            time.sleep(1)
+            workers.add(spawn(sock))
+
+    sock.close()
+    print("[OK] All workers stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Test the background audit-log writer.
+
+- log_incident returns without waiting for MongoDB or Kafka
+- events are written in batches (size and interval), with one unordered
+  insert_many and one batched Kafka produce per batch
+- each overflow policy behaves as documented and counts its drops
+- drain() writes out everything queued at shutdown, reports a batch still
+  in flight when it times out, and a late batch cannot restart Kafka
+"""
+import asyncio
+import contextlib
+import io
+import threading
+import time
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+import app.services.kafka_producer as kafka_producer
+import app.utils.logger as logger
+from app.services.audit_writer import AuditWriter
+from checks import check, finish
+
+
+class SlowCollection:
+    """Stands in for attack_logs: 200 ms per insert_many, one failing document"""
+
+    def __init__(self):
+        self.calls = []
+
+    def insert_many(self, docs, ordered=True):
+        time.sleep(0.2)
+        self.calls.append((len(docs), ordered))
+        for doc in docs:
+            doc["_id"] = ObjectId()
+        bad = [i for i, doc in enumerate(docs) if doc.get("text") == "bad"]
+        if bad:
+            raise BulkWriteError({"writeErrors": [{"index": i} for i in bad]})
+
+
+async def logger_checks():
+    collection, published = SlowCollection(), []
+    logger.attack_logs = collection
+    logger.publish_attacks = lambda events: (time.sleep(0.2), published.append(events))
+    logger.record_events = lambda events: None  # metrics rollup: see test_metrics_rollup.py
+
+    start = time.perf_counter()
+    for i in range(300):
+        await logger.log_incident({"text": "bad" if i == 7 else f"prompt {i}", "decision": "block"})
+    per_event_us = (time.perf_counter() - start) / 300 * 1e6
+    check(per_event_us < 500, f"log_incident: {per_event_us:.0f} us per event with a 400 ms sink")
+
+    await logger.audit_writer.drain()
+    events = [e for batch in published for e in batch]
+    check(len(events) == 300 and sum(n for n, _ in collection.calls) == 300, "Drain wrote all 300 events")
+    check(all(not ordered for _, ordered in collection.calls), f"{len(collection.calls)} unordered insert_many call(s)")
+    check(len(published) == len(collection.calls), "One Kafka batch per MongoDB batch")
+    ids = {e["text"]: e["_id"] for e in events}
+    check(ids["bad"] == "unavailable" and isinstance(ids["prompt 0"], str) and len(ids["prompt 0"]) == 24,
+          "Kafka events carry string ids; the failed insert is marked unavailable")
+    stats = logger.audit_writer.stats()
+    check(stats["written"] == 299 and stats["failed"] == 1,
+          f"Failed insert counted as failed, not written: written {stats['written']}, failed {stats['failed']}")
+
+
+def blocked_writer(overflow):
+    release, written = threading.Event(), []
+
+    def write(batch):
+        release.wait(5)
+        written.extend(e["n"] for e in batch)
+
+    return AuditWriter(write, queue_size=10, flush_size=5, flush_interval=0.01, overflow=overflow), release, written
+
+
+async def overflow_checks():
+    # The first event is picked up by the blocked writer, so 11 fit before the queue is full
+    for policy, expected in (("drop_new", list(range(11))), ("drop_oldest", [0] + list(range(10, 20))),
+                             ("block", list(range(11)))):
+        writer, release, written = blocked_writer(policy)
+        await writer.enqueue({"n": 0})
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        accepted = [await writer.enqueue({"n": n}) for n in range(1, 20)]
+        elapsed = time.perf_counter() - start
+        release.set()
+        await writer.drain()
+        check(sorted(written) == expected and writer.stats()["dropped"] == 9,
+              f"{policy}: kept {len(written)}, dropped {writer.stats()['dropped']}, "
+              f"{accepted.count(False)} refused, enqueue took {elapsed * 1000:.0f} ms")
+
+    writer = AuditWriter(lambda batch: None, flush_size=1000, flush_interval=0.1)
+    await writer.enqueue({"n": 1})
+    await asyncio.sleep(0.3)
+    check(writer.stats()["written"] == 1, "A lone event is flushed after the interval, not held for a full batch")
+    await writer.drain()
+
+
+async def shutdown_checks():
+    # MongoDB hangs: drain times out with a batch in flight, which finishes after Kafka shut down
+    created = []
+
+    class Producer:
+        def __init__(self, conf):
+            created.append(self)
+
+    kafka_producer.Producer = Producer
+    kafka_producer._config = lambda: {"bootstrap.servers": "mock:9092", "sasl.username": "mock"}
+    release = threading.Event()
+
+    def write(batch):
+        release.wait(5)
+        kafka_producer.publish_attacks(batch)
+
+    writer = AuditWriter(write, flush_size=5, flush_interval=0.01)
+    for n in range(3):
+        await writer.enqueue({"n": n})
+    await asyncio.sleep(0.05)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        await writer.drain(timeout=0.1)
+    check("3 of 3 events not written (3 in flight)" in out.getvalue(),
+          f"Drain timeout reports the in-flight batch: {out.getvalue().strip()}")
+
+    kafka_producer.shutdown_producer()
+    release.set()
+    await asyncio.sleep(0.1)
+    check(not created and kafka_producer.producer is None, "A batch finishing after shutdown does not start a producer")
+
+
+print("=" * 80)
+print("AUDIT WRITER TEST")
+print("=" * 80)
+
+asyncio.run(logger_checks())
+asyncio.run(overflow_checks())
+asyncio.run(shutdown_checks())
+
+finish("audit writer")
@@ -0,0 +1,122 @@
+"""
+Test the incrementally maintained attack metrics rollup.
+
+Uses in-memory stand-ins for the attack_logs and metrics_rollups
+collections (no MongoDB needed). Checks that each audit batch applies
+one $inc to the rollup, that /summary is served without touching
+attack_logs, that avg_risk averages the `risk` field /scan writes (cascade
+lower bounds excluded), and that the backfill rebuilds the same rollup
+from the logs.
+"""
+import random
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+import app.services.metrics_service as metrics_service
+import app.utils.logger as logger
+from checks import check, finish
+
+
+class FakeCursor(list):
+    def batch_size(self, n):
+        return self
+
+
+class FakeCollection:
+    """The handful of pymongo collection calls the rollup code makes"""
+
+    def __init__(self):
+        self.docs = {}
+        self.calls = []
+
+    def insert_many(self, docs, ordered=True):
+        self.calls.append("insert_many")
+        bad = []
+        for i, doc in enumerate(docs):
+            doc["_id"] = ObjectId()
+            if doc.get("text") == "bad":
+                bad.append(i)
+            else:
+                self.docs[doc["_id"]] = dict(doc)
+        if bad:
+            raise BulkWriteError({"writeErrors": [{"index": i} for i in bad]})
+
+    def find(self, filter=None, projection=None):
+        self.calls.append("find")
+        fields = set(projection or {}) | {"_id"}
+        return FakeCursor({k: v for k, v in doc.items() if k in fields} for doc in self.docs.values())
+
+    def find_one(self, filter):
+        self.calls.append("find_one")
+        doc = self.docs.get(filter["_id"])
+        return dict(doc) if doc else None
+
+    def update_one(self, filter, update, upsert=False):
+        self.calls.append("update_one")
+        doc = self.docs.setdefault(filter["_id"], {"_id": filter["_id"]})
+        metrics_service._merge(doc, update)
+        doc.update(update.get("$set", {}))
+
+    def replace_one(self, filter, doc, upsert=False):
+        self.calls.append("replace_one")
+        self.docs[filter["_id"]] = dict(doc)
+
+    def count_documents(self, *args, **kwargs):
+        raise AssertionError("summary must not scan attack_logs")
+
+    aggregate = count_documents
+
+
+def scan_event(rng, i):
+    decision = rng.choices(["allow", "sanitize", "block"], [6, 2, 2])[0]
+    brains = rng.sample(["injection", "ethics", "narrative"], rng.randint(0, 2)) or ["none"]
+    return {"text": f"prompt {i}", "decision": decision, "risk": round(rng.random(), 3),
+            "triggered_by": brains, "timestamp": 1_760_000_000 + i}
+
+
+print("=" * 80)
+print("METRICS ROLLUP TEST")
+print("=" * 80)
+
+logs, rollups = FakeCollection(), FakeCollection()
+logger.attack_logs = logs
+logger.publish_attacks = lambda events: None
+metrics_service.attack_logs = logs
+metrics_service.metrics_rollups = rollups
+
+rng = random.Random(3)
+batches = [[scan_event(rng, b * 100 + i) for i in range(100)] for b in range(10)]
+batches[3].append({"text": "policy", "decision": {"decision": "block", "reason": "ethics"}, "timestamp": 1_760_000_400})
+batches[5].append({"text": "bad", "decision": "block", "risk": 0.99, "triggered_by": ["injection"]})
+batches[7].append({"text": "settled early", "decision": "allow", "risk": 0.02, "risk_lower_bound": True,
+                   "triggered_by": ["injection"], "timestamp": 1_760_000_700})
+for batch in batches:
+    logger._write_batch(batch)
+
+logged = [e for batch in batches for e in batch if e["text"] != "bad"]
+check(rollups.calls.count("update_one") == len(batches), f"{len(batches)} audit batches -> {len(batches)} rollup $inc updates")
+
+rollups.calls.clear()
+summary = metrics_service.get_attack_metrics()
+check(rollups.calls == ["find_one"], "Summary is one find_one on the rollup (attack_logs untouched)")
+scored = [e for e in logged if not e.get("risk_lower_bound")]
+risks = [e["risk"] for e in scored if "risk" in e]
+blocks = sum(1 for e in logged if e["decision"] in ("block", {"decision": "block", "reason": "ethics"}))
+check(summary["total_attacks"] == len(logged) and summary["by_decision"]["block"] == blocks,
+      f"Counts match the logged events: {summary['total_attacks']} total, {summary['by_decision']}")
+check(summary["avg_risk"] == round(sum(risks) / len(risks), 2), f"avg_risk {summary['avg_risk']} is the mean of `risk`")
+check(summary["by_brain"]["injection"] == sum("injection" in e.get("triggered_by", []) for e in scored),
+      f"Per-brain counts: {summary['by_brain']}")
+check(summary["lower_bound_events"] == 1, "Cascade lower-bound event counted, but kept out of avg_risk and by_brain")
+check(summary["first_event_at"] == 1_760_000_000 and summary["last_event_at"] == 1_760_000_999, "First / last event times")
+
+live = {k: v for k, v in rollups.docs["summary"].items() if k != "updated_at"}
+rollups.docs.clear()
+check(metrics_service.get_attack_metrics()["total_attacks"] == 0, "Empty rollup -> zero summary")
+metrics_service.backfill(batch_size=250)
+rebuilt = {k: v for k, v in rollups.docs["summary"].items() if k != "updated_at"}
+rebuilt["risk_sum"], live["risk_sum"] = round(rebuilt["risk_sum"], 6), round(live["risk_sum"], 6)
+check(rebuilt == live, "Backfill rebuilds the same rollup from attack_logs")
+
+finish("metrics rollup")